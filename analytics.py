@@ -0,0 +1,126 @@
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+import reports
+
+# Rolling averages, period-over-period changes and running totals over the
+# daily series (revenue, sessions, clicks, impressions...), for many series
+# at once. The series are laid out as one days x series array on a gap-free
+# daily calendar (a day a source reported nothing for counts as zero), and
+# every measure is a few whole-array NumPy operations: rolling sums are
+# differences of the cumulative sum, and period changes compare a rolling
+# sum with itself shifted back by the period. Results are kept in the shared
+# report cache under a hash of the values they were computed from, so they
+# are computed once per data refresh; reruns and other sessions looking at
+# the same data get the cached ones.
+
+ROLLING_WINDOWS = (7, 28)
+# name: (days summed, days back). YoY looks back 364 days so weekdays line up.
+PERIODS = {"wow": (7, 7), "mom": (28, 28), "yoy": (28, 364)}
+# Measures don't go stale, only the data does (and new data hashes differently)
+TTL = reports.HISTORICAL_TTL
+
+# Column headings for Trends.latest() tables
+LABELS = {
+    "avg_7d": "7-day avg",
+    "avg_28d": "28-day avg",
+    "wow": "WoW %",
+    "mom": "MoM %",
+    "yoy": "YoY %",
+    "cumulative": "Total",
+}
+
+
+def ratio(numerator, denominator):
+    # numerator / denominator, NaN where the denominator is 0 or missing.
+    # Scalars or arrays.
+    numerator = np.asarray(numerator, dtype=float)
+    denominator = np.asarray(denominator, dtype=float)
+    out = np.full(np.broadcast(numerator, denominator).shape, np.nan)
+    np.divide(numerator, denominator, out=out, where=denominator != 0)
+    return out[()] if out.ndim == 0 else out
+
+
+def change(current, previous):
+    # Percentage change, NaN when there's nothing to compare with
+    return ratio(np.subtract(current, previous, dtype=float), previous) * 100
+
+
+def rolling_sum(values, window):
+    # values: days x series. Sum over the `window` days ending on each day,
+    # NaN until there are that many days.
+    sums = np.full(values.shape, np.nan)
+    if len(values) >= window:
+        totals = np.concatenate([np.zeros((1, values.shape[1])), np.cumsum(values, axis=0)])
+        sums[window - 1:] = totals[window:] - totals[:-window]
+    return sums
+
+
+def shifted(values, days):
+    # Each row replaced by the one `days` rows earlier (NaN before the start)
+    out = np.full(values.shape, np.nan)
+    if days < len(values):
+        out[days:] = values[:len(values) - days]
+    return out
+
+
+class Trends:
+
+    def __init__(self, days, columns, values):
+        # days: a gap-free DatetimeIndex; values: days x columns
+        self.days = days
+        self.columns = list(columns)
+        self.values = values
+        windows = set(ROLLING_WINDOWS) | {window for window, _ in PERIODS.values()}
+        sums = {window: rolling_sum(values, window) for window in windows}
+        self.measures = {f"avg_{window}d": sums[window] / window for window in ROLLING_WINDOWS}
+        for name, (window, back) in PERIODS.items():
+            self.measures[name] = change(sums[window], shifted(sums[window], back))
+        self.measures["cumulative"] = np.cumsum(values, axis=0)
+
+    def __len__(self):
+        return len(self.days)
+
+    def nbytes(self):
+        return int(self.days.nbytes + self.values.nbytes + sum(m.nbytes for m in self.measures.values()))
+
+    def frame(self, column):
+        # One row per day: the series' values and every measure of it
+        i = self.columns.index(column)
+        return pd.DataFrame({
+            "date": self.days,
+            column: self.values[:, i],
+            **{name: measure[:, i] for name, measure in self.measures.items()},
+        })
+
+    def latest(self):
+        # One row per series, every measure as of the last day
+        if not len(self):
+            return pd.DataFrame(np.nan, index=self.columns, columns=list(self.measures))
+        return pd.DataFrame({name: measure[-1] for name, measure in self.measures.items()}, index=self.columns)
+
+
+def _daily_values(df, columns, date):
+    daily = df.dropna(subset=[date]).groupby(date)[columns].sum()
+    if daily.empty:
+        return pd.DatetimeIndex([]), np.zeros((0, len(columns)))
+    days = pd.date_range(daily.index.min(), daily.index.max(), freq="D")
+    return days, np.nan_to_num(daily.reindex(days).to_numpy(dtype=float))
+
+
+def trends(df, columns, date="date"):
+    # df: a daily series frame, such as daily_store's: a datetime `date`
+    # column plus the metric columns. Only additive metrics make sense here
+    # (not ctr or position).
+    columns = list(columns)
+    days, values = _daily_values(df, columns, date)
+    digest = hashlib.blake2b(values.tobytes(), digest_size=16)
+    digest.update(repr((days[:1].tolist(), columns)).encode())
+    key = f"analytics:{digest.hexdigest()}"
+    result = reports.report_cache.get(key)
+    if result is None:
+        result = Trends(days, columns, values)
+        reports.report_cache.put(key, result, TTL)
+    return result
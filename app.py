@@ -1,11 +1,14 @@
 import streamlit as st
-from time import sleep
 from nav import make_sidebar
+import warm
 
 st.logo("assets/whd_logo.png")
 
 make_sidebar()
 
+# Background cache warmer, if DASHBOARD_WARM_INTERVAL is set
+warm.start_scheduler()
+
 st.title("Welcome to the Webhive Portal")
 
 st.write("Please log in to continue (username `test`, password `test`).")
@@ -16,8 +19,7 @@ password = st.text_input("Password", type="password")
 if st.button("Log in", type="primary"):
     if username == "test" and password == "test":
         st.session_state.logged_in = True
-        st.success("Logged in successfully!")
-        sleep(0.5)
+        st.session_state.username = username
         st.switch_page("pages/sales.py")
     else:
         st.error("Incorrect username or password")
\ No newline at end of file
@@ -0,0 +1,112 @@
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+from google.analytics.data_v1beta.types import MetricType, RunReportResponse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import decode
+
+# Compares the columnar decoders in decode.py with the per-row dict path the
+# pages used to build frames with.
+#
+#   python benchmarks/bench_decode.py --rows 100000
+
+
+def per_row_ga4_frame(response):
+    dimensions = [header.name for header in response.dimension_headers]
+    metrics = [(header.name, header.type_) for header in response.metric_headers]
+    data = []
+    for row in response.rows:
+        record = {name: value.value for name, value in zip(dimensions, row.dimension_values)}
+        for (name, type_), value in zip(metrics, row.metric_values):
+            record[name] = int(value.value) if type_ == MetricType.TYPE_INTEGER else float(value.value)
+        data.append(record)
+    df = pd.DataFrame(data, columns=dimensions + [name for name, _ in metrics])
+    if "date" in dimensions:
+        df["date"] = pd.to_datetime(df["date"], format="%Y%m%d")
+    return df
+
+
+def per_row_gsc_frame(rows, dimensions):
+    data = [
+        {
+            **dict(zip(dimensions, row['keys'])),
+            'clicks': row['clicks'],
+            'impressions': row['impressions'],
+            'ctr': row['ctr'],
+            'position': row['position'],
+        }
+        for row in rows
+    ]
+    df = pd.DataFrame(data, columns=list(dimensions) + ['clicks', 'impressions', 'ctr', 'position'])
+    if "date" in dimensions:
+        df["date"] = pd.to_datetime(df["date"])
+    return df
+
+
+def ga4_response(n):
+    dates = pd.date_range("2024-01-01", periods=365).strftime("%Y%m%d")
+    return RunReportResponse(
+        dimension_headers=[{"name": "date"}, {"name": "itemName"}],
+        metric_headers=[
+            {"name": "itemsPurchased", "type_": MetricType.TYPE_INTEGER},
+            {"name": "itemRevenue", "type_": MetricType.TYPE_CURRENCY},
+        ],
+        rows=[
+            {
+                "dimension_values": [{"value": dates[i % 365]}, {"value": f"Product {i % 5000}"}],
+                "metric_values": [{"value": str(i % 17)}, {"value": f"{i * 0.37:.2f}"}],
+            }
+            for i in range(n)
+        ],
+    )
+
+
+def gsc_rows(n):
+    dates = pd.date_range("2024-01-01", periods=365).strftime("%Y-%m-%d")
+    return [
+        {"keys": [dates[i % 365], f"query {i}"], "clicks": i % 40, "impressions": i % 900,
+         "ctr": 0.04, "position": 7.5}
+        for i in range(n)
+    ]
+
+
+def best_of(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark report decoders")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    response = ga4_response(args.rows)
+    rows = gsc_rows(args.rows)
+    # Same values; the columnar frame just stores them more compactly
+    pd.testing.assert_frame_equal(
+        per_row_ga4_frame(response), decode.ga4_frame(response).astype(object), check_dtype=False,
+    )
+
+    cases = [
+        ("GA4", lambda: per_row_ga4_frame(response), lambda: decode.ga4_frame(response)),
+        ("GSC", lambda: per_row_gsc_frame(rows, ["date", "query"]), lambda: decode.gsc_frame(rows, ["date", "query"])),
+    ]
+    print(f"{args.rows:,} rows, best of {args.repeat}")
+    for name, per_row, columnar in cases:
+        slow = best_of(per_row, args.repeat)
+        fast = best_of(columnar, args.repeat)
+        print(f"{name}: per-row {slow * 1000:8.1f} ms   columnar {fast * 1000:8.1f} ms   {slow / fast:5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
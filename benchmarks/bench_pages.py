@@ -0,0 +1,111 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Keep the benchmark's local store and diagnostics log out of the real ones
+# (both are read when their modules are imported)
+WORKDIR = tempfile.mkdtemp(prefix="bench-pages-")
+os.environ["DASHBOARD_STORE_PATH"] = os.path.join(WORKDIR, "daily_metrics.sqlite")
+os.environ["DASHBOARD_DIAGNOSTICS_LOG"] = os.path.join(WORKDIR, "diagnostics.jsonl")
+
+from streamlit.testing.v1 import AppTest
+
+import clients
+import daily_store
+import fakes
+import reports
+from rate_limit import limiter
+
+# Renders the login page and the Sales and SEO pages through Streamlit's
+# AppTest harness against the local fakes in fakes.py, so page performance
+# can be measured without Google credentials. For each page: a cold run
+# (empty report cache, cube and daily store) and a warm rerun, with wall
+# time, upstream GA4/GSC calls and peak Python memory of each.
+#
+#   python benchmarks/bench_pages.py --rows 500 --latency 0.2 --repeat 3
+
+PAGES = ["app.py", "pages/sales.py", "pages/seo.py"]
+
+
+def reset():
+    # Back to a cold process: nothing cached in memory or on disk
+    reports.report_cache.clear()
+    if os.path.exists(daily_store.store.path):
+        os.remove(daily_store.store.path)
+    daily_store.store._ready = False
+    limiter._quota.clear()
+
+
+def app_test(page):
+    at = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=300)
+    at.secrets["ga4_service_account"] = {"client_email": "bench-ga4@example.com"}
+    at.secrets["gsc_service_account"] = {"client_email": "bench-gsc@example.com"}
+    if page != "app.py":
+        at.session_state["logged_in"] = True
+        at.switch_page(page)
+    return at
+
+
+def measure(run, ga4, gsc):
+    calls = ga4.calls, gsc.calls
+    tracemalloc.reset_peak()
+    baseline = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    at = run()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] - baseline
+    if at.exception:
+        raise RuntimeError(f"page raised: {at.exception[0].value}")
+    return at, {
+        "time": elapsed,
+        "ga4": ga4.calls - calls[0],
+        "gsc": gsc.calls - calls[1],
+        "peak": peak,
+    }
+
+
+def bench_page(page, ga4, gsc, repeat):
+    # Best time of `repeat` cold/warm pairs; calls and memory from that pair
+    best = None
+    for _ in range(repeat):
+        reset()
+        at, cold = measure(lambda: app_test(page).run(), ga4, gsc)
+        _, warm = measure(lambda: at.run(), ga4, gsc)
+        if best is None or cold["time"] < best[0]["time"]:
+            best = cold, warm
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark dashboard page renders against fake backends")
+    parser.add_argument("--rows", type=int, default=50, help="rows per non-date report from the fakes")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every fake API call")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--pages", nargs="+", default=PAGES)
+    args = parser.parse_args()
+
+    ga4 = fakes.FakeGA4Client(rows=args.rows, latency=args.latency, tokens_per_hour=10**8)
+    gsc = fakes.FakeSearchConsole(rows=args.rows, latency=args.latency)
+    clients.registry.ga4 = lambda info: ga4
+    clients.registry.gsc = lambda info: gsc
+
+    tracemalloc.start()
+    print(f"rows={args.rows} latency={args.latency:g}s, best of {args.repeat}")
+    print(f"{'page':<16}{'cold ms':>10}{'warm ms':>10}{'GA4 calls':>12}{'GSC calls':>12}{'cold peak MB':>14}{'warm peak MB':>14}")
+    for page in args.pages:
+        cold, warm = bench_page(page, ga4, gsc, args.repeat)
+        print(
+            f"{page:<16}{cold['time'] * 1000:10.1f}{warm['time'] * 1000:10.1f}"
+            f"{cold['ga4']:>7} / {warm['ga4']:<2}{cold['gsc']:>7} / {warm['gsc']:<2}"
+            f"{cold['peak'] / 2**20:14.1f}{warm['peak'] / 2**20:14.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import argparse
+import asyncio
+import statistics
+import tempfile
+import time
+
+import load_pages
+from load_pages import Session, read_samples
+
+# Cold start of the dashboard server: time from `streamlit run` to a
+# healthy server, the login page for the first session of a fresh process
+# and for a second new session, and the first login through to Sales.
+# Also lists which heavy modules (pandas, altair, the Google clients) the
+# server has imported once the login page is up. Uses the fake backends
+# and server from load_pages.py.
+#
+#   python benchmarks/bench_startup.py --repeat 5
+
+
+async def first_sessions(port, samples_path):
+    first, second = Session(port), Session(port)
+    await first.connect()
+    try:
+        times = {"first login page": await first.rerun()}
+        await asyncio.sleep(2 * load_pages.SAMPLE_INTERVAL)
+        loaded = read_samples(samples_path)[-1]["heavy_modules"]
+        await second.connect()
+        try:
+            times["new session login page"] = await second.rerun()
+        finally:
+            second.close()
+        times["first login to sales"] = await first.rerun([
+            first.widget("text_input", "Username", string_value="test"),
+            first.widget("text_input", "Password", string_value="test"),
+            first.widget("button", "Log in", trigger_value=True),
+        ])
+    finally:
+        first.close()
+    return times, loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark server start and first paint for new sessions")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--rows", type=int, default=50, help="rows per non-date report from the fakes")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every fake API call")
+    args = parser.parse_args()
+
+    timings = {}
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        server, port, samples_path = load_pages.start_server(args, tempfile.mkdtemp(prefix="bench-startup-"))
+        timings.setdefault("server start", []).append(time.perf_counter() - started)
+        try:
+            times, loaded = asyncio.run(first_sessions(port, samples_path))
+        finally:
+            server.terminate()
+            server.wait()
+        for name, t in times.items():
+            timings.setdefault(name, []).append(t)
+
+    print(f"median of {args.repeat} fresh server processes")
+    for name, ts in timings.items():
+        print(f"{name:<24}{statistics.median(ts) * 1000:10.0f} ms")
+    print(f"heavy modules loaded by the login page: {', '.join(loaded) or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
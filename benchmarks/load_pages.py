@@ -0,0 +1,403 @@
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Load test for a single dashboard server. Starts `streamlit run app.py` in
+# a child process with clients.registry pointed at the fakes in fakes.py,
+# then connects N simulated browsers over Streamlit's websocket protocol.
+# Each one logs in through the form on app.py, lands on Sales, changes the
+# date range, flips the revenue table to page 2 (a fragment rerun, as in
+# the browser), goes to SEO, changes its dates and comes back to Sales, for
+# --rounds rounds.
+#
+# Reported per session count: reruns/s, p50/p95/p99 rerun latency (request
+# sent to script_finished received), the shared fetch pool's saturation and
+# the page prefetch pool's peak sampled inside the server, upstream calls,
+# and server RSS growth per connected session over a baseline taken after
+# one warm-up session.
+#
+#   python benchmarks/load_pages.py --sessions 1 5 10 20 --latency 0.2
+
+SAMPLE_INTERVAL = 0.25
+# Modules the login page shouldn't need; samples list which are loaded
+HEAVY_MODULES = ("pandas", "altair", "google.analytics.data_v1beta", "googleapiclient.discovery")
+# Date range lengths the simulated users pick from, in days
+SPANS = [30, 90, 365]
+
+
+# Server (child process)
+
+def rss_bytes():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def streaming_stats():
+    # Not imported here, so the heavy-module check still sees what the
+    # app itself loaded
+    streaming = sys.modules.get("streaming")
+    return streaming.stats() if streaming else {"busy": 0, "peak_busy": 0}
+
+
+def _sample(path, backends):
+    import executor
+
+    calls = lambda name: backends[name].calls if name in backends else 0
+    with open(path, "a", buffering=1) as f:
+        while True:
+            f.write(json.dumps({
+                "t": time.time(),
+                "rss": rss_bytes(),
+                "threads": threading.active_count(),
+                "heavy_modules": [name for name in HEAVY_MODULES if name in sys.modules],
+                "ga4_calls": calls("ga4"),
+                "gsc_calls": calls("gsc"),
+                **executor.stats(),
+                # Page prefetches, once the reporting stack is loaded
+                "prefetch_busy": streaming_stats()["busy"],
+                "prefetch_peak": streaming_stats()["peak_busy"],
+            }) + "\n")
+            time.sleep(SAMPLE_INTERVAL)
+
+
+def serve(args):
+    os.environ["DASHBOARD_STORE_PATH"] = os.path.join(args.workdir, "daily_metrics.sqlite")
+    os.environ["DASHBOARD_DIAGNOSTICS_LOG"] = os.path.join(args.workdir, "diagnostics.jsonl")
+
+    import streamlit as st
+    from streamlit.runtime.secrets import Secrets
+    from streamlit.web import bootstrap
+
+    import clients
+
+    # Built on first use, like the real clients, so the fakes' own imports
+    # (pandas, the GA4 types) don't load before a page needs them
+    backends = {}
+    lock = threading.Lock()
+
+    def backend(name):
+        with lock:
+            if name not in backends:
+                import fakes
+                if name == "ga4":
+                    backends[name] = fakes.FakeGA4Client(rows=args.rows, latency=args.latency, tokens_per_hour=10**8)
+                else:
+                    backends[name] = fakes.FakeSearchConsole(rows=args.rows, latency=args.latency)
+            return backends[name]
+
+    clients.registry.ga4 = lambda info: backend("ga4")
+    clients.registry.gsc = lambda info: backend("gsc")
+    secrets = Secrets()
+    secrets._secrets = {
+        "ga4_service_account": {"client_email": "load-ga4@example.com"},
+        "gsc_service_account": {"client_email": "load-gsc@example.com"},
+    }
+    st.secrets = secrets
+
+    threading.Thread(target=_sample, args=(args.samples, backends), name="load-sampler", daemon=True).start()
+    flags = {
+        "server.port": args.port,
+        "server.headless": True,
+        "server.fileWatcherType": "none",
+        "server.runOnSave": False,
+        "browser.gatherUsageStats": False,
+        "logger.level": "error",
+    }
+    bootstrap.load_config_options(flags)
+    bootstrap.run(os.path.join(ROOT, "app.py"), False, [], flags)
+
+
+# Simulated browser
+
+class Session:
+
+    def __init__(self, port):
+        self.url = f"ws://localhost:{port}/_stcore/stream"
+        self.ws = None
+        self.pages = {}
+        self.page = ""
+        # Widgets of the latest run: (type, label) -> id, id -> fragment id
+        self.widgets = {}
+        self.fragments = {}
+        # Current value of every widget, as the browser would send it
+        self.values = {}
+        self.errors = 0
+
+    async def connect(self):
+        from tornado.websocket import websocket_connect
+
+        self.ws = await websocket_connect(self.url, max_message_size=2**30)
+
+    def close(self):
+        if self.ws is not None:
+            self.ws.close()
+
+    async def rerun(self, changes=(), page=None, widget=None):
+        # changes: WidgetStates to apply; widget: the (type, label) changed,
+        # so a widget inside a fragment reruns just that fragment
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+
+        for state in changes:
+            self.values[state.id] = state
+        msg = BackMsg()
+        client_state = msg.rerun_script
+        client_state.page_script_hash = page if page is not None else self.page
+        if widget is not None:
+            client_state.fragment_id = self.fragments.get(self.widgets[widget], "")
+        if page is None or page == self.page:
+            live = set(self.widgets.values())
+            client_state.widget_states.widgets.extend(
+                state for id, state in self.values.items() if id in live
+            )
+        started = time.perf_counter()
+        await self.ws.write_message(msg.SerializeToString(), binary=True)
+        await self._finish()
+        # Buttons fire once
+        self.values = {id: state for id, state in self.values.items() if not state.HasField("trigger_value")}
+        return time.perf_counter() - started
+
+    async def _finish(self):
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        while True:
+            raw = await self.ws.read_message()
+            if raw is None:
+                raise ConnectionError("server closed the websocket")
+            msg = ForwardMsg()
+            msg.ParseFromString(raw)
+            kind = msg.WhichOneof("type")
+            if kind == "new_session" and not msg.new_session.fragment_ids_this_run:
+                self.page = msg.new_session.page_script_hash
+                self.pages = {page.url_pathname or page.page_name: page.page_script_hash for page in msg.new_session.app_pages}
+                self.widgets = {}
+                self.fragments = {}
+            elif kind == "delta" and msg.delta.WhichOneof("type") == "new_element":
+                self._element(msg.delta)
+            elif kind == "script_finished":
+                if msg.script_finished == ForwardMsg.FINISHED_WITH_COMPILE_ERROR:
+                    raise RuntimeError("script failed to compile")
+                if msg.script_finished != ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                    return
+
+    def _element(self, delta):
+        element = delta.new_element
+        kind = element.WhichOneof("type")
+        if kind == "exception":
+            self.errors += 1
+            return
+        proto = getattr(element, kind)
+        if hasattr(proto, "id") and hasattr(proto, "label") and proto.id:
+            self.widgets[(kind, proto.label)] = proto.id
+            if delta.fragment_id:
+                self.fragments[proto.id] = delta.fragment_id
+
+    def widget(self, kind, label, **value):
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+        state = WidgetState(id=self.widgets[(kind, label)])
+        for field, v in value.items():
+            if field == "string_array_value":
+                state.string_array_value.data.extend(v)
+            else:
+                setattr(state, field, v)
+        return state
+
+    def date_range(self, days):
+        end = datetime.date.today()
+        current = end - datetime.timedelta(days=days - 1), end
+        compared = current[0] - datetime.timedelta(days=days), current[0] - datetime.timedelta(days=1)
+        dates = [current[0], current[1], compared[0], compared[1]]
+        labels = [
+            "Start date of current month", "End date of current month",
+            "Start date of month to compare", "End date of month to compare",
+        ]
+        return [
+            self.widget("date_input", label, string_array_value=[date.strftime("%Y/%m/%d")])
+            for label, date in zip(labels, dates)
+        ]
+
+
+async def scenario(session, rounds, think, timings, offset=0):
+    async def step(name, coro):
+        timings.setdefault(name, []).append(await coro)
+        if think:
+            await asyncio.sleep(random.uniform(0, 2 * think))
+
+    await step("open", session.rerun())
+    await step("login", session.rerun([
+        session.widget("text_input", "Username", string_value="test"),
+        session.widget("text_input", "Password", string_value="test"),
+        session.widget("button", "Log in", trigger_value=True),
+    ]))
+    sales = session.page
+    for i in range(rounds):
+        days = SPANS[(offset + i) % len(SPANS)]
+        await step("sales.dates", session.rerun(session.date_range(days)))
+        page_widget = ("number_input", "Page")
+        if page_widget in session.widgets:
+            await step("sales.page", session.rerun(
+                [session.widget(*page_widget, int_value=2)], widget=page_widget,
+            ))
+        await step("seo", session.rerun(page=session.pages["seo"]))
+        await step("seo.dates", session.rerun(session.date_range(days)))
+        await step("sales", session.rerun(page=sales))
+
+
+async def run_sessions(sessions, rounds, think, timings, samples_path=None):
+    # Every websocket stays open until the last session is done (and, with
+    # samples_path, until the server has sampled RSS with all of them
+    # connected)
+    await asyncio.gather(*(session.connect() for session in sessions))
+    try:
+        await asyncio.gather(*(
+            scenario(session, rounds, think, timings, offset=i)
+            for i, session in enumerate(sessions)
+        ))
+        if samples_path:
+            await asyncio.sleep(2 * SAMPLE_INTERVAL)
+    finally:
+        for session in sessions:
+            session.close()
+
+
+# Driver
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("localhost", 0))
+        return s.getsockname()[1]
+
+
+def start_server(args, workdir):
+    port = free_port()
+    samples = os.path.join(workdir, "samples.jsonl")
+    log = open(os.path.join(workdir, "server.log"), "w")
+    server = subprocess.Popen([
+        sys.executable, os.path.abspath(__file__), "--serve",
+        "--port", str(port), "--samples", samples, "--workdir", workdir,
+        "--rows", str(args.rows), "--latency", str(args.latency),
+    ], cwd=ROOT, stdout=log, stderr=subprocess.STDOUT)
+    deadline = time.time() + 60
+    while True:
+        try:
+            with urllib.request.urlopen(f"http://localhost:{port}/_stcore/health", timeout=1) as response:
+                if response.status == 200:
+                    return server, port, samples
+        except OSError:
+            if server.poll() is not None or time.time() > deadline:
+                server.kill()
+                raise RuntimeError(f"server did not start, see {log.name}")
+            time.sleep(0.2)
+
+
+def read_samples(path, since=0.0):
+    with open(path) as f:
+        return [s for s in map(json.loads, f) if s["t"] >= since]
+
+
+def load_level(args, n):
+    workdir = tempfile.mkdtemp(prefix="load-pages-")
+    server, port, samples_path = start_server(args, workdir)
+    try:
+        if args.warmup:
+            asyncio.run(run_sessions([Session(port)], 1, 0, {}))
+        time.sleep(2 * SAMPLE_INTERVAL)
+        baseline = read_samples(samples_path)[-1]
+
+        timings = {}
+        sessions = [Session(port) for _ in range(n)]
+
+        started = time.time()
+        asyncio.run(run_sessions(sessions, args.rounds, args.think, timings, samples_path))
+        wall = time.time() - started
+        end = read_samples(samples_path)[-1]
+        during = read_samples(samples_path, since=started)
+    finally:
+        server.terminate()
+        server.wait()
+
+    latencies = np.array([t for ts in timings.values() for t in ts])
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+    busy = np.array([s["busy"] for s in during])
+    return {
+        "sessions": n,
+        "reruns": len(latencies),
+        "errors": sum(session.errors for session in sessions),
+        "reruns/s": len(latencies) / wall,
+        "p50": p50,
+        "p95": p95,
+        "p99": p99,
+        "pool_peak": max(s["peak_busy"] for s in during),
+        "pool_saturated": float(np.mean(busy >= baseline["workers"])),
+        "queued_max": max(s["queued"] for s in during),
+        "prefetch_peak": max(s["prefetch_peak"] for s in during),
+        "rss_per_session": (end["rss"] - baseline["rss"]) / n,
+        "ga4": end["ga4_calls"] - baseline["ga4_calls"],
+        "gsc": end["gsc_calls"] - baseline["gsc_calls"],
+        "by_step": {
+            name: np.percentile(ts, [50, 95]) * 1000 for name, ts in timings.items()
+        },
+        "workers": baseline["workers"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the dashboard with concurrent simulated sessions")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 5, 10])
+    parser.add_argument("--rounds", type=int, default=2, help="times each session goes Sales -> SEO -> Sales")
+    parser.add_argument("--think", type=float, default=0.5, help="mean pause between actions, seconds")
+    parser.add_argument("--rows", type=int, default=50, help="rows per non-date report from the fakes")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every fake API call")
+    parser.add_argument("--no-warmup", dest="warmup", action="store_false")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--samples", help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+
+    print(f"rows={args.rows} latency={args.latency:g}s rounds={args.rounds} think={args.think:g}s")
+    print(
+        f"{'sessions':>8}{'reruns':>8}{'errors':>8}{'reruns/s':>10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+        f"{'pool peak':>11}{'saturated':>11}{'queued':>8}{'prefetch':>10}{'RSS/session MB':>16}{'GA4':>6}{'GSC':>6}"
+    )
+    results = []
+    for n in args.sessions:
+        r = load_level(args, n)
+        results.append(r)
+        print(
+            f"{r['sessions']:>8}{r['reruns']:>8}{r['errors']:>8}{r['reruns/s']:10.2f}"
+            f"{r['p50']:9.0f}{r['p95']:9.0f}{r['p99']:9.0f}"
+            f"{r['pool_peak']:>6} / {r['workers']:<2}{r['pool_saturated']:10.0%} {r['queued_max']:>7}{r['prefetch_peak']:>10}"
+            f"{r['rss_per_session'] / 2**20:16.1f}{r['ga4']:>6}{r['gsc']:>6}"
+        )
+    print()
+    print("p50 / p95 ms per step")
+    for r in results:
+        steps = ", ".join(f"{name} {p50:.0f}/{p95:.0f}" for name, (p50, p95) in r["by_step"].items())
+        print(f"{r['sessions']:>8}  {steps}")
+
+
+if __name__ == "__main__":
+    main()
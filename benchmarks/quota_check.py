@@ -0,0 +1,107 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Sets up a temporary store and diagnostics log, like the benchmark does
+import bench_pages
+import clients
+import fakes
+import page_reports
+from rate_limit import limiter
+
+# Drives the Sales and SEO pages through AppTest against a fake GA4 client
+# with a small token budget, checking the quota paths end to end: running
+# out mid-render, lower priorities being shed as the budget runs low, stored
+# data being served once it's gone, and transient errors being retried.
+# Every page has to render without an exception and without sitting in
+# backoff. Exits non-zero on the first failed check.
+#
+#   python benchmarks/quota_check.py
+
+# A page that waits this long was retrying instead of deferring
+MAX_SECONDS = 5
+
+
+def use(ga4, gsc=None):
+    clients.registry.ga4 = lambda info: ga4
+    clients.registry.gsc = lambda info: gsc or fakes.FakeSearchConsole(rows=20)
+
+
+def render(page, at=None):
+    # (AppTest, seconds, page text) after a run that must not raise
+    before = limiter.stats()
+    started = time.perf_counter()
+    at = (at or bench_pages.app_test(page)).run()
+    elapsed = time.perf_counter() - started
+    if at.exception:
+        fail(f"{page} raised: {at.exception[0].value}")
+    if elapsed > MAX_SECONDS:
+        fail(f"{page} took {elapsed:.1f}s")
+    after = limiter.stats()
+    counts = {name: after[name] - before[name] for name in ("retries", "deferred")}
+    text = " ".join(str(e.value) for kind in (at.warning, at.info) for e in kind)
+    return at, elapsed, counts, text
+
+
+def fail(message):
+    print(f"FAIL {message}")
+    sys.exit(1)
+
+
+def check(name, ok, detail):
+    print(f"{'ok  ' if ok else 'FAIL'} {name}: {detail}")
+    if not ok:
+        sys.exit(1)
+
+
+def main():
+    # Out of tokens part-way through a cold render: two calls' worth
+    bench_pages.reset()
+    ga4 = fakes.FakeGA4Client(rows=20, tokens_per_hour=20)
+    use(ga4)
+    _, elapsed, counts, text = render("pages/sales.py")
+    check("exhausted, cold", "quota has run out" in text and counts["retries"] == 0,
+          f"{elapsed:.2f}s, {ga4.calls} GA4 calls, {counts}")
+    remaining = limiter.remaining(page_reports.PROPERTY_ID)
+    check("exhausted property marked", remaining == 0.0, f"remaining {remaining}")
+
+    # Running low: 80% of the hour spent. Sales learns that from its
+    # responses, then SEO's LOW report is shed
+    bench_pages.reset()
+    ga4 = fakes.FakeGA4Client(rows=20, tokens_per_hour=1000)
+    ga4.consumed = 800
+    use(ga4)
+    render("pages/sales.py")
+    _, elapsed, counts, text = render("pages/seo.py")
+    check("shedding", counts["deferred"] > 0 and "Top landing pages are paused" in text,
+          f"{elapsed:.2f}s, {counts}")
+
+    # Everything stored with plenty of quota, then the report cache (KPI
+    # cubes included) is emptied and quota runs out: the pages come from
+    # the store, and refetching its unsettled days and the cube fails
+    bench_pages.reset()
+    use(fakes.FakeGA4Client(rows=20, tokens_per_hour=10**8))
+    render("pages/sales.py")
+    render("pages/seo.py")
+    bench_pages.reports.report_cache.clear()
+    limiter._quota.clear()
+    use(fakes.FakeGA4Client(rows=20, tokens_per_hour=0))
+    for page in ("pages/sales.py", "pages/seo.py"):
+        at, elapsed, counts, text = render(page)
+        charts = len(at.get("arrow_vega_lite_chart"))
+        check(f"stored data, {page}", "quota has run out" in text and charts > 0,
+              f"{elapsed:.2f}s, {charts} charts, {counts}")
+
+    # Transient errors on every third call are retried with backoff
+    bench_pages.reset()
+    ga4 = fakes.FakeGA4Client(rows=20, tokens_per_hour=10**8, flaky=3)
+    use(ga4)
+    _, elapsed, counts, text = render("pages/sales.py")
+    check("backoff", counts["retries"] > 0 and "quota" not in text,
+          f"{elapsed:.2f}s, {ga4.calls} GA4 calls, {counts}")
+
+
+if __name__ == "__main__":
+    main()
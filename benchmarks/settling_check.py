@@ -0,0 +1,109 @@
+import datetime
+import os
+import sys
+import time
+import types
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Sets up a temporary store and diagnostics log, like the benchmark does
+import bench_pages
+import daily_store
+import fakes
+import kpi_cube
+import page_reports
+import reports
+from quota_check import check
+
+# Checks, on a frozen clock, that days still settling aren't marked final in
+# the daily store or a KPI cube on the strength of a frame served from the
+# report cache. A delta fetched late on one day is still cached just after
+# midnight; if it were stamped with the day it was served rather than the
+# day it was fetched, its oldest day would count as settled and never be
+# fetched again. Exits non-zero on the first failed check.
+#
+#   python benchmarks/settling_check.py
+
+
+class Clock:
+    # Stands in for the time and date reports.py sees; advance() moves both
+    # the wall clock and the monotonic one that cache TTLs run on
+
+    def __init__(self, start):
+        self.wall = start.timestamp()
+        self.mono = time.monotonic()
+
+    def time(self):
+        return self.wall
+
+    def monotonic(self):
+        return self.mono
+
+    def today(self):
+        return datetime.date.fromtimestamp(self.wall)
+
+    def advance(self, seconds):
+        self.wall += seconds
+        self.mono += seconds
+
+
+def freeze(clock):
+    class Date(datetime.date):
+        @classmethod
+        def today(cls):
+            return clock.today()
+
+    reports.time = types.SimpleNamespace(time=clock.time, monotonic=clock.monotonic)
+    reports.datetime = types.SimpleNamespace(date=Date)
+
+
+def replay(name, run, missing):
+    # run() brings 03-01..03-09 up to date; missing() is what's still
+    # waiting on a fetch
+    bench_pages.reset()
+    clock = Clock(datetime.datetime(2025, 3, 10, 23, 30))
+    freeze(clock)
+    ga4 = fakes.FakeGA4Client()
+
+    # Mar 10: everything fetched, then the unsettled days again, which
+    # leaves that delta in the report cache under SETTLING_TTL
+    run(ga4)
+    check(f"{name}, settling on Mar 10", missing() == ("2025-03-08", "2025-03-09"), f"missing {missing()}")
+    run(ga4)
+
+    # Mar 11, 45 minutes later: the delta comes from the cache, and 03-08
+    # (final from Mar 11) is still waiting on a fetch made on or after it
+    clock.advance(45 * 60)
+    calls = ga4.calls
+    run(ga4)
+    check(f"{name}, cached delta on Mar 11", ga4.calls == calls and missing() == ("2025-03-08", "2025-03-09"),
+          f"{ga4.calls - calls} GA4 calls, missing {missing()}")
+
+    # Once the cached delta has expired (stale grace and all), the refetch
+    # settles 03-08
+    clock.advance(reports.SETTLING_TTL + max(reports.MAX_STALE.values()))
+    run(ga4)
+    check(f"{name}, refetched on Mar 11", ga4.calls > calls and missing() == ("2025-03-09", "2025-03-09"),
+          f"{ga4.calls - calls} GA4 calls, missing {missing()}")
+
+
+def main():
+    report = page_reports.daily_sales_report("2025-03-01", "2025-03-09")
+    replay(
+        "daily store",
+        lambda ga4: daily_store.ga4_daily(ga4, report),
+        lambda: daily_store.store.missing_range(
+            "ga4", report.property_id, report.metrics, "2025-03-01", "2025-03-09"),
+    )
+
+    items = page_reports.daily_items_report("2025-03-01", "2025-03-09")
+    cube = []
+    replay(
+        "KPI cube",
+        lambda ga4: cube.append(kpi_cube.ga4_cube(ga4, items, [("2025-03-01", "2025-03-09")], "itemCategory")),
+        lambda: cube[-1].missing_range("2025-03-01", "2025-03-09"),
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,41 +1,68 @@
 import streamlit as st
-from streamlit_echarts import st_echarts
 import datetime
-import streamlit_authenticator as stauth
-import yaml
-from yaml.loader import SafeLoader
+import os
 
-# Date range calendar
+import memory
+import range_chart
+import uploads
 
-today = datetime.datetime.now()
-next_year = today.year + 1
-jan_1 = datetime.date(next_year, 1, 1)
-dec_31 = datetime.date(next_year, 12, 31)
+# Date range calendar: the window the upload charts open on (their sliders
+# scrub from there)
+
+today = datetime.date.today()
 
 d = st.date_input(
     "Please select a date range",
-    (jan_1, datetime.date(next_year, 1, 7)),
-    jan_1,
-    dec_31,
+    (today - datetime.timedelta(days=89), today),
     format="MM.DD.YYYY",
 )
+# Only the start date while the end is being picked
+window = tuple(d) if len(d) == 2 else None
 
-option = {
-    "xAxis": {
-        "type": "category",
-        "data": ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"],
-    },
-    "yAxis": {"type": "value"},
-    "series": [{"data": [820, 932, 901, 934, 1290, 1330, 1320], "type": "line"}],
-}
-st_echarts(
-    options=option, height="400px",
-)
-
+# Uploaded exports are parsed in blocks into Parquet on disk once per
+# upload (see uploads.py); the page only ever reads a preview, the summary
+# and per-day totals back from the file.
 uploaded_files = st.file_uploader(
-    "Upload a file", accept_multiple_files=True
+    "Upload a CSV export", type="csv", accept_multiple_files=True
 )
+ingested = st.session_state.setdefault("uploads", {})
 for uploaded_file in uploaded_files:
-    bytes_data = uploaded_file.read()
-    st.write("filename:", uploaded_file.name)
-    st.write(bytes_data)
\ No newline at end of file
+    upload = ingested.get(uploaded_file.file_id)
+    if upload is None:
+        try:
+            with st.spinner(f"Reading {uploaded_file.name}..."):
+                upload = uploads.ingest(uploaded_file)
+        except ValueError as e:
+            st.error(f"Couldn't read {uploaded_file.name}: {e}")
+            continue
+        ingested[uploaded_file.file_id] = upload
+
+    st.subheader(upload.name)
+    st.caption(
+        f"{upload.summary['rows']:,} rows, "
+        f"{memory.format_bytes(os.path.getsize(upload.path))} as Parquet"
+    )
+    st.dataframe(uploads.preview(upload))
+    st.dataframe(uploads.summary_frame(upload), hide_index=True)
+
+    date_columns, metric_columns = upload.columns("date"), upload.columns("number")
+    if date_columns and metric_columns:
+        date_column = st.selectbox("Date", date_columns, key=f"{uploaded_file.file_id}_date")
+        metric = st.selectbox("Metric", metric_columns, key=f"{uploaded_file.file_id}_metric")
+        # Per-day totals are small; keep them rather than rescan the file
+        # on every rerun
+        daily_frames = st.session_state.setdefault(f"{uploaded_file.file_id}_daily", {})
+        if (date_column, metric) not in daily_frames:
+            daily_frames[(date_column, metric)] = uploads.daily(upload, date_column, [metric])
+        daily = daily_frames[(date_column, metric)]
+        range_chart.range_chart(
+            daily, "date", [metric], key=f"{uploaded_file.file_id}_chart",
+            window=window, title=metric,
+        )
+
+# Forget uploads that have been removed from the uploader
+current = {uploaded_file.file_id for uploaded_file in uploaded_files}
+for file_id in list(ingested):
+    if file_id not in current:
+        del ingested[file_id]
+        st.session_state.pop(f"{file_id}_daily", None)
@@ -0,0 +1,142 @@
+import datetime
+import threading
+import time
+
+from google.auth.transport.requests import Request
+from google.oauth2 import service_account
+
+# Process-wide registry of Google API clients. Page scripts rerun on every
+# widget interaction, but the GA4 client (and its gRPC channel), the Search
+# Console service and the service-account tokens are built once per process
+# and shared by every session. The client libraries themselves are imported
+# on first use, so a page that only needs GA4 never loads the Search Console
+# discovery client or httplib2.
+
+GA4_SCOPES = ("https://www.googleapis.com/auth/analytics.readonly",)
+GSC_SCOPES = ("https://www.googleapis.com/auth/webmasters.readonly",)
+
+# Refresh tokens this long before they expire, checked every REFRESH_INTERVAL
+REFRESH_MARGIN = 5 * 60
+REFRESH_INTERVAL = 60
+HTTP_TIMEOUT = 60
+
+
+class ClientRegistry:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._credentials = {}
+        # Per account and scopes, held while its first token is fetched
+        self._credential_locks = {}
+        self._ga4_clients = {}
+        self._gsc_services = {}
+        self._http_pools = 0
+        self._local = threading.local()
+        self._refresher = None
+
+    def credentials(self, info, scopes):
+        key = (info["client_email"], tuple(scopes))
+        with self._lock:
+            credentials = self._credentials.get(key)
+            if credentials is not None:
+                return credentials
+            lock = self._credential_locks.setdefault(key, threading.Lock())
+        # The token fetch is a network round trip: only sessions waiting on
+        # the same account wait for it, not every client lookup
+        with lock:
+            with self._lock:
+                credentials = self._credentials.get(key)
+            if credentials is None:
+                credentials = service_account.Credentials.from_service_account_info(
+                    dict(info), scopes=list(scopes)
+                )
+                credentials.refresh(Request())
+                with self._lock:
+                    self._credentials[key] = credentials
+                    self._start_refresher()
+            return credentials
+
+    def ga4(self, info):
+        key = info["client_email"]
+        credentials = self.credentials(info, GA4_SCOPES)
+        with self._lock:
+            client = self._ga4_clients.get(key)
+            if client is None:
+                from google.analytics.data_v1beta import BetaAnalyticsDataClient
+
+                # One client means one gRPC channel, shared by all sessions
+                client = BetaAnalyticsDataClient(credentials=credentials)
+                self._ga4_clients[key] = client
+            return client
+
+    def gsc(self, info):
+        key = info["client_email"]
+        credentials = self.credentials(info, GSC_SCOPES)
+        with self._lock:
+            service = self._gsc_services.get(key)
+            if service is None:
+                from googleapiclient.discovery import build
+
+                service = build('searchconsole', 'v1', credentials=credentials, cache_discovery=False)
+                self._gsc_services[key] = service
+            return service
+
+    def gsc_http(self, service):
+        # httplib2 isn't thread-safe, so each thread keeps its own connection
+        # pool per service and passes it to execute().
+        pools = getattr(self._local, "pools", None)
+        if pools is None:
+            pools = self._local.pools = {}
+        http = pools.get(id(service))
+        if http is None:
+            import google_auth_httplib2
+            import httplib2
+
+            credentials = service._http.credentials
+            http = google_auth_httplib2.AuthorizedHttp(credentials, http=httplib2.Http(timeout=HTTP_TIMEOUT))
+            pools[id(service)] = http
+            with self._lock:
+                self._http_pools += 1
+        return http
+
+    def stats(self):
+        with self._lock:
+            return {
+                "credentials": len(self._credentials),
+                "ga4_clients": len(self._ga4_clients),
+                "gsc_services": len(self._gsc_services),
+                "grpc_channels": len(self._ga4_clients),
+                "http_pools": self._http_pools,
+            }
+
+    def _start_refresher(self):
+        if self._refresher is None:
+            self._refresher = threading.Thread(target=self._refresh_loop, name="token-refresher", daemon=True)
+            self._refresher.start()
+
+    def _refresh_loop(self):
+        request = Request()
+        while True:
+            time.sleep(REFRESH_INTERVAL)
+            with self._lock:
+                credentials = list(self._credentials.values())
+            for creds in credentials:
+                # google-auth keeps expiry as a naive UTC datetime
+                expires_in = (creds.expiry - datetime.datetime.utcnow()).total_seconds() if creds.expiry else 0
+                if not creds.valid or expires_in < REFRESH_MARGIN:
+                    try:
+                        creds.refresh(request)
+                    except Exception:
+                        # Leave it to the next request to refresh inline
+                        pass
+
+
+registry = ClientRegistry()
+
+
+def ga4_client(info):
+    return registry.ga4(info)
+
+
+def gsc_service(info):
+    return registry.gsc(info)
@@ -0,0 +1,170 @@
+import datetime
+import json
+import os
+import sqlite3
+import threading
+from dataclasses import replace
+
+import pandas as pd
+
+import reports
+from rate_limit import QuotaDeferred
+
+# Local per-day metric store. Daily series (GA4 revenue/sessions, GSC clicks
+# etc.) are kept in SQLite, one row per source/scope/metric/day, so a range
+# query only goes to Google for days we don't have yet or that were fetched
+# before they had settled. A year-long chart is then a local read plus one
+# small delta request covering the last few days.
+
+STORE_PATH = os.environ.get(
+    "DASHBOARD_STORE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "daily_metrics.sqlite"),
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS daily_metrics (
+    source TEXT NOT NULL,
+    scope TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    date TEXT NOT NULL,
+    value NUMERIC,
+    PRIMARY KEY (source, scope, metric, date)
+);
+CREATE TABLE IF NOT EXISTS fetched_days (
+    source TEXT NOT NULL,
+    scope TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    date TEXT NOT NULL,
+    fetched_on TEXT NOT NULL,
+    PRIMARY KEY (source, scope, metric, date)
+);
+"""
+
+
+class DailyStore:
+
+    def __init__(self, path=STORE_PATH, settling_days=reports.SETTLING_DAYS):
+        self.path = path
+        self.settling_days = settling_days
+        self._write_lock = threading.Lock()
+        self._ready = False
+
+    def _connect(self):
+        if not self._ready:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with sqlite3.connect(self.path) as conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.executescript(SCHEMA)
+            self._ready = True
+        return sqlite3.connect(self.path, timeout=30)
+
+    def missing_range(self, source, scope, metrics, start, end):
+        # Smallest contiguous range covering every day that isn't final yet:
+        # never fetched, or last fetched while it was still settling.
+        days = pd.date_range(start, end, freq="D").strftime("%Y-%m-%d")
+        if len(days) == 0:
+            return None
+        placeholders = ",".join("?" * len(metrics))
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT metric, date, fetched_on FROM fetched_days "
+                f"WHERE source = ? AND scope = ? AND metric IN ({placeholders}) AND date BETWEEN ? AND ?",
+                (source, scope, *metrics, days[0], days[-1]),
+            ).fetchall()
+        final = {}
+        for metric, date, fetched_on in rows:
+            settled_on = datetime.date.fromisoformat(date) + datetime.timedelta(days=self.settling_days)
+            if datetime.date.fromisoformat(fetched_on) >= settled_on:
+                final[date] = final.get(date, 0) + 1
+        needed = [day for day in days if final.get(day, 0) < len(metrics)]
+        if not needed:
+            return None
+        return needed[0], needed[-1]
+
+    def write(self, source, scope, metrics, start, end, df, fetched_at):
+        # fetched_at: when df came from upstream (reports.fetched_at), which
+        # decides whether its days were final yet
+        fetched_on = datetime.date.fromtimestamp(fetched_at).isoformat()
+        dates = df["date"].dt.strftime("%Y-%m-%d")
+        values = [
+            (source, scope, metric, date, _sql_value(value))
+            for metric in metrics
+            for date, value in zip(dates, df[metric])
+        ]
+        fetched = [
+            (source, scope, metric, day, fetched_on)
+            for metric in metrics
+            for day in pd.date_range(start, end, freq="D").strftime("%Y-%m-%d")
+        ]
+        with self._write_lock, self._connect() as conn:
+            conn.executemany("INSERT OR REPLACE INTO daily_metrics VALUES (?, ?, ?, ?, ?)", values)
+            conn.executemany("INSERT OR REPLACE INTO fetched_days VALUES (?, ?, ?, ?, ?)", fetched)
+
+    def read(self, source, scope, metrics, start, end):
+        placeholders = ",".join("?" * len(metrics))
+        with self._connect() as conn:
+            long = pd.read_sql_query(
+                f"SELECT date, metric, value FROM daily_metrics "
+                f"WHERE source = ? AND scope = ? AND metric IN ({placeholders}) AND date BETWEEN ? AND ?",
+                conn,
+                params=(source, scope, *metrics, start, end),
+            )
+        if long.empty:
+            return pd.DataFrame({"date": pd.Series(dtype="datetime64[ns]"), **{m: pd.Series(dtype=float) for m in metrics}})
+        df = long.pivot(index="date", columns="metric", values="value").reindex(columns=list(metrics))
+        df = df.reset_index().rename_axis(columns=None)
+        df["date"] = pd.to_datetime(df["date"])
+        for metric in metrics:
+            # SQLite hands back one value column for every metric; give count
+            # metrics (sessions, clicks...) their integer dtype back.
+            column = df[metric]
+            if column.notna().all() and (column % 1 == 0).all():
+                df[metric] = column.astype("int64")
+        return df.sort_values("date", ignore_index=True)
+
+    def series(self, source, scope, metrics, start, end, fetch):
+        # fetch(start, end) must return (frame, fetched_at): a frame with a
+        # datetime 'date' column plus one column per metric, and when it was
+        # fetched from upstream.
+        metrics = list(metrics)
+        delta = self.missing_range(source, scope, metrics, start, end)
+        if delta is not None:
+            try:
+                self.write(source, scope, metrics, *delta, *fetch(*delta))
+            except QuotaDeferred:
+                # Quota is low: serve what we have locally and catch up later
+                reports.note_deferred()
+        return self.read(source, scope, metrics, start, end)
+
+
+def _sql_value(value):
+    return value.item() if hasattr(value, "item") else value
+
+
+store = DailyStore()
+
+
+def _stamped(run, client, report):
+    df = run(client, report)
+    return df, reports.fetched_at(report, df)
+
+
+def ga4_daily(client, report):
+    if report.dimensions != ("date",):
+        raise ValueError("ga4_daily only handles reports with a single 'date' dimension")
+    scope = report.property_id
+    if report.filters:
+        scope += json.dumps(report.filters)
+    return store.series(
+        "ga4", scope, report.metrics, report.start_date, report.end_date,
+        lambda start, end: _stamped(reports.run_report, client, replace(report, start_date=start, end_date=end)),
+    )
+
+
+def gsc_daily(service, query):
+    if query.dimensions != ("date",):
+        raise ValueError("gsc_daily only handles queries with a single 'date' dimension")
+    return store.series(
+        "gsc", query.site_url, ["clicks", "impressions", "ctr", "position"], query.start_date, query.end_date,
+        lambda start, end: _stamped(reports.run_gsc_query, service, replace(query, start_date=start, end_date=end)),
+    )
@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+
+# Thins out long time series before they go into a Vega-Lite spec. A line
+# can't show more points than the chart is pixels wide, so each series is
+# cut to about the chart's width. Points are bucketed by calendar period,
+# the finest of day / week / month / quarter that fits, and only each
+# bucket's lowest and highest point are kept. Peaks and dips survive and
+# values stay in their original units (no weekly sums on a daily axis).
+
+DEFAULT_MAX_POINTS = 700
+
+# Calendar buckets to try, finest first
+PERIODS = ("D", "W", "M", "Q")
+
+
+def _buckets(x, max_points):
+    if pd.api.types.is_datetime64_any_dtype(x):
+        for period in PERIODS:
+            buckets = x.dt.to_period(period)
+            if 2 * buckets.nunique() <= max_points:
+                return buckets.to_numpy()
+    # Nothing calendar-shaped fits: equal-sized runs of points
+    return np.arange(len(x)) * (max_points // 2) // len(x)
+
+
+def positions(x, y, max_points=DEFAULT_MAX_POINTS):
+    # Sorted positions of the min and max of `y` per bucket of `x`. x is a
+    # sorted Series, y a Series without NaN, both with a default index.
+    buckets = _buckets(x, max_points)
+    grouped = y.groupby(buckets, sort=False)
+    return np.union1d(grouped.idxmin().to_numpy(), grouped.idxmax().to_numpy())
+
+
+def min_max(df, x, y, max_points=DEFAULT_MAX_POINTS):
+    # Rows of `df` keeping the min and max of `y` per bucket of `x`
+    if len(df) <= max_points:
+        return df
+    df = df.dropna(subset=[y]).sort_values(x, ignore_index=True)
+    return df.iloc[positions(df[x], df[y], max_points)]
+
+
+def for_chart(df, x, y, by=None, max_points=DEFAULT_MAX_POINTS):
+    # One line per `by` group (e.g. 'DateRange'), each capped separately
+    if len(df) <= max_points:
+        return df
+    if by is None:
+        return min_max(df, x, y, max_points)
+    return pd.concat(
+        [min_max(group, x, y, max_points) for _, group in df.groupby(by, sort=False)],
+        ignore_index=True,
+    )
@@ -0,0 +1,87 @@
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# Runs a page's independent report fetches concurrently so a render costs
+# roughly the slowest call instead of the sum of all of them. The pool is
+# shared by every session; MAX_CONCURRENCY caps how many of a single page's
+# fetches are in flight at once. Fetches run in a copy of the caller's
+# context, so per-render state like reports.track_freshness() follows them.
+
+POOL_WORKERS = int(os.environ.get("DASHBOARD_FETCH_WORKERS", 16))
+MAX_CONCURRENCY = int(os.environ.get("DASHBOARD_FETCH_CONCURRENCY", 6))
+REQUEST_TIMEOUT = float(os.environ.get("DASHBOARD_FETCH_TIMEOUT", 60))
+# Seconds between checks while some of a page's fetches are still queued
+QUEUE_POLL = 0.1
+
+pool = ThreadPoolExecutor(max_workers=POOL_WORKERS, thread_name_prefix="report-fetch")
+
+# Fetches currently running on the pool and the most ever at once. When
+# busy sits at POOL_WORKERS, new fetches wait in the pool's queue.
+_busy = 0
+_peak_busy = 0
+_busy_lock = threading.Lock()
+
+
+class FetchTimeout(TimeoutError):
+    pass
+
+
+def fetch_all(fetches, max_concurrency=MAX_CONCURRENCY, timeout=REQUEST_TIMEOUT):
+    # fetches: {name: zero-argument callable returning a DataFrame}
+    # Returns {name: DataFrame} in the same order; the first failure is
+    # re-raised. Each request gets `timeout` seconds from when a worker
+    # starts it, so time spent queued behind other sessions' fetches
+    # doesn't count against it.
+    queued = list(fetches.items())
+    running = {}
+    results = {}
+    while queued or running:
+        while queued and len(running) < max_concurrency:
+            name, fetch = queued.pop(0)
+            started = []
+            running[pool.submit(_counted, started, contextvars.copy_context().run, fetch)] = (name, started)
+
+        starts = [started[0] for _, started in running.values() if started]
+        wait_for = max(min(starts) + timeout - time.monotonic(), 0) if starts else timeout
+        if len(starts) < len(running):
+            # Check back soon for queued fetches to start their clocks
+            wait_for = min(wait_for, QUEUE_POLL)
+        done, _ = wait(running, timeout=wait_for, return_when=FIRST_COMPLETED)
+        for future in done:
+            name, _ = running.pop(future)
+            results[name] = future.result()
+
+        now = time.monotonic()
+        for future, (name, started) in running.items():
+            if started and now - started[0] >= timeout:
+                for other in running:
+                    other.cancel()
+                raise FetchTimeout(f"{name} did not finish within {timeout:g}s")
+    return {name: results[name] for name in fetches}
+
+
+def _counted(started, fn, *args):
+    # started: gets the time the fetch was picked up by a worker
+    global _busy, _peak_busy
+    started.append(time.monotonic())
+    with _busy_lock:
+        _busy += 1
+        _peak_busy = max(_peak_busy, _busy)
+    try:
+        return fn(*args)
+    finally:
+        with _busy_lock:
+            _busy -= 1
+
+
+def stats():
+    with _busy_lock:
+        return {
+            "workers": POOL_WORKERS,
+            "busy": _busy,
+            "peak_busy": _peak_busy,
+            "queued": pool._work_queue.qsize(),
+        }
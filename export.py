@@ -0,0 +1,259 @@
+import argparse
+import datetime
+import logging
+import os
+import secrets
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import replace
+
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+import streamlit as st
+
+import page_reports
+import rate_limit
+import streaming
+from reports import GSCQuery
+
+# Bulk exports of GA4 / Search Console reports to Parquet or CSV. Rows go
+# straight from the paginated fetches in streaming.py into the file, a page
+# at a time, so an export of any size only ever holds a page or two in
+# memory. Nothing goes through the report cache: a one-off multi-million-row
+# pull would only push the dashboards' own reports out of it.
+#
+# A pull can cover several properties (or Search Console sites) and date
+# ranges; every part lands in the same file, tagged with its property and
+# range. In the app, exports are written under static/exports/ and served
+# by Streamlit's static file handler, which streams the file from disk
+# (st.download_button would hold all of it in memory). Each export gets its
+# own unguessable directory, so its link works for anyone who has it, logged
+# in or not, until it's deleted after EXPORT_TTL. Headless, for
+# cron or other schedulers:
+#
+#     python export.py daily_sales --last 30 --out exports/sales-{date}.parquet
+#     python export.py sessions --range 2024-01-01 2024-12-31 --range 2025-01-01 2025-12-31 \
+#         --property 389980673 --property 123456789 --format csv --out sessions.csv
+
+log = logging.getLogger("export")
+
+FORMATS = ("parquet", "csv")
+EXPORT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "exports")
+# Seconds an export stays downloadable, and how often expired ones are
+# looked for
+EXPORT_TTL = 60 * 60
+PRUNE_INTERVAL = 60
+
+# Columns tagging each row with the part of the pull it came from
+PART_COLUMNS = ("property", "range_start", "range_end")
+
+# What can be exported: name: (label, report for (start, end)). Ranked
+# reports are exported in full, still ranked.
+REPORTS = {
+    "daily_sales": ("Daily sales", page_reports.daily_sales_report),
+    "item_sales": ("Item sales by day", page_reports.daily_items_report),
+    "top_products": ("Products by items purchased", lambda start, end: replace(page_reports.top_products_report(start, end), limit=None)),
+    "sessions": ("Daily sessions", page_reports.daily_sessions_report),
+    "organic": ("Organic search users", page_reports.organic_report),
+    "landing_pages": ("Landing pages by active users", lambda start, end: replace(page_reports.landing_pages_report(start, end), limit=None)),
+    "paid_search": ("Daily paid search sessions", page_reports.daily_paid_search_report),
+    "gsc_daily": ("Search Console by day", page_reports.daily_gsc_query),
+    "gsc_queries": ("Search Console queries by day", lambda start, end: replace(page_reports.daily_gsc_query(start, end), dimensions=("date", "query"))),
+    "gsc_pages": ("Search Console pages by day", lambda start, end: replace(page_reports.daily_gsc_query(start, end), dimensions=("date", "page"))),
+}
+
+
+def parts(name, ranges, properties=()):
+    # One report per (property, range). ranges: (start, end) date strings;
+    # properties: GA4 property ids or Search Console site URLs, default
+    # the dashboard's own. Exports are bulk work, so they're the first to
+    # give way when quota runs low.
+    for start, end in ranges:
+        report = replace(REPORTS[name][1](start, end), priority=rate_limit.LOW)
+        field = "site_url" if isinstance(report, GSCQuery) else "property_id"
+        for prop in properties or [getattr(report, field)]:
+            yield replace(report, **{field: str(prop)})
+
+
+def pull(ga4_client, gsc_service, reports):
+    # Frames, a page at a time, from every report in turn, each tagged
+    # with PART_COLUMNS
+    for report in reports:
+        if isinstance(report, GSCQuery):
+            pages, prop = streaming.iter_gsc_pages(gsc_service, report), report.site_url
+        else:
+            pages, prop = streaming.iter_ga4_pages(ga4_client, report), report.property_id
+        for page in pages:
+            yield page.assign(**dict(zip(PART_COLUMNS, (prop, report.start_date, report.end_date))))
+
+
+def _file_schema(table):
+    # One schema for every page: categoricals as plain strings, integers
+    # as int64 (pages differ in whether they fit int32) and GA4/GSC dates
+    # as dates rather than midnight timestamps
+    fields = []
+    for f in table.schema:
+        kind = f.type
+        if pa.types.is_dictionary(kind):
+            kind = kind.value_type
+        if pa.types.is_integer(kind):
+            kind = pa.int64()
+        elif f.name == "date" and pa.types.is_timestamp(kind):
+            kind = pa.date32()
+        elif pa.types.is_null(kind):
+            kind = pa.string()
+        fields.append(pa.field(f.name, kind))
+    return pa.schema(fields)
+
+
+def _open(path, fmt, schema):
+    if fmt == "parquet":
+        return pq.ParquetWriter(path, schema)
+    return pa_csv.CSVWriter(path, schema)
+
+
+def write(frames, path, fmt, progress=None):
+    # Writes the frames (all with the same columns) to path as they arrive,
+    # one row group / CSV chunk each. Returns the number of rows; progress,
+    # if given, is called with the running total after every frame.
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown export format {fmt!r}")
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    # Written to a temp file next to its final name, then moved into place
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=f".{fmt}.tmp")
+    os.close(fd)
+    writer = schema = first = None
+    rows = 0
+    try:
+        for frame in frames:
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if not table.num_rows:
+                # Empty pages can't say what type their columns are
+                if first is None:
+                    first = table
+                continue
+            if writer is None:
+                schema = _file_schema(table)
+                writer = _open(tmp_path, fmt, schema)
+            writer.write_table(table.cast(schema))
+            rows += table.num_rows
+            if progress is not None:
+                progress(rows)
+        if writer is None:
+            if first is None:
+                raise ValueError("nothing to export")
+            # No rows anywhere: just the columns
+            writer = _open(tmp_path, fmt, _file_schema(first))
+        writer.close()
+        os.replace(tmp_path, path)
+    except BaseException:
+        if writer is not None:
+            writer.close()
+        os.remove(tmp_path)
+        raise
+    return rows
+
+
+def export(ga4_client, gsc_service, name, ranges, properties=(), path=None, fmt="parquet", progress=None):
+    # Pulls report `name` for every range and property into one file.
+    # Returns (path, rows); without a path the file goes under EXPORT_DIR.
+    if path is None:
+        path = os.path.join(EXPORT_DIR, secrets.token_urlsafe(16), filename(name, ranges, fmt))
+    rows = write(pull(ga4_client, gsc_service, parts(name, ranges, properties)), path, fmt, progress)
+    return path, rows
+
+
+def filename(name, ranges, fmt):
+    starts, ends = zip(*ranges)
+    return f"{name}_{min(starts)}_{max(ends)}.{fmt}"
+
+
+def url(path):
+    # Where Streamlit's static file handler serves a file under EXPORT_DIR
+    return "app/static/exports/" + os.path.relpath(path, EXPORT_DIR).replace(os.sep, "/")
+
+
+def prune(max_age=EXPORT_TTL):
+    # Deletes exports older than max_age seconds
+    if not os.path.isdir(EXPORT_DIR):
+        return
+    cutoff = time.time() - max_age
+    for entry in os.scandir(EXPORT_DIR):
+        if entry.stat().st_mtime >= cutoff:
+            continue
+        if entry.is_dir():
+            shutil.rmtree(entry.path, ignore_errors=True)
+        else:
+            os.remove(entry.path)
+
+
+_pruner = None
+_pruner_lock = threading.Lock()
+
+
+def _prune_every(interval):
+    while True:
+        try:
+            prune()
+        except OSError:
+            log.exception("pruning exports failed")
+        time.sleep(interval)
+
+
+def start_pruner(interval=PRUNE_INTERVAL):
+    # Safe to call on every script run: starts one pruning thread per
+    # process, so exports expire on time whether or not anyone comes back
+    global _pruner
+    with _pruner_lock:
+        if _pruner is None:
+            _pruner = threading.Thread(target=_prune_every, args=(interval,), name="export-pruner", daemon=True)
+            _pruner.start()
+    return _pruner
+
+
+def _clients():
+    import clients
+
+    return (
+        clients.ga4_client(st.secrets["ga4_service_account"]),
+        clients.gsc_service(st.secrets["gsc_service_account"]),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a dashboard report to Parquet or CSV.")
+    parser.add_argument("report", choices=list(REPORTS))
+    parser.add_argument("--range", nargs=2, action="append", metavar=("START", "END"), dest="ranges",
+                        help="date range (YYYY-MM-DD), repeatable")
+    parser.add_argument("--last", type=int, action="append", metavar="DAYS",
+                        help="the last DAYS days up to today, repeatable")
+    parser.add_argument("--property", action="append", dest="properties",
+                        help="GA4 property id or Search Console site URL, repeatable (default: the dashboard's)")
+    parser.add_argument("--format", choices=FORMATS, default=None, help="default: from the --out extension, else parquet")
+    parser.add_argument("--out", required=True, help="output file; {date} is replaced by today's date")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+
+    today = datetime.date.today()
+    ranges = [tuple(r) for r in args.ranges or []]
+    for days in args.last or ([] if ranges else [30]):
+        ranges.append(((today - datetime.timedelta(days=days - 1)).isoformat(), today.isoformat()))
+    path = args.out.format(date=today.isoformat())
+    fmt = args.format or ("csv" if path.endswith(".csv") else "parquet")
+
+    started = time.perf_counter()
+    try:
+        _, rows = export(*_clients(), args.report, ranges, args.properties or (), path, fmt)
+    except (rate_limit.QuotaDeferred, ValueError) as e:
+        log.error("%s: %s", args.report, e)
+        sys.exit(1)
+    log.info("%s: %d rows to %s in %.1fs", args.report, rows, path, time.perf_counter() - started)
+
+
+if __name__ == "__main__":
+    main()
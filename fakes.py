@@ -0,0 +1,157 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import httplib2
+import pandas as pd
+from google.api_core import exceptions as api_exceptions
+from google.analytics.data_v1beta.types import (
+    BatchRunReportsResponse,
+    MetricType,
+    PropertyQuota,
+    RunReportResponse,
+)
+from googleapiclient.errors import HttpError
+
+# Local stand-ins for BetaAnalyticsDataClient and the Search Console service,
+# for exercising the dashboard without Google credentials. Both generate
+# deterministic rows for whatever is asked, can add latency per call, and
+# can simulate running out of quota or (GA4) transient errors.
+
+INTEGER_METRICS = {
+    "activeUsers", "newUsers", "engagedSessions", "sessions",
+    "itemsViewed", "itemsPurchased",
+}
+
+
+class FakeGA4Client:
+
+    def __init__(self, rows=50, latency=0.0, tokens_per_hour=40_000, tokens_per_request=10, flaky=0):
+        # rows: rows per date range for reports without a date dimension;
+        # flaky: every flaky-th call fails with a transient 503
+        self.rows = rows
+        self.flaky = flaky
+        self.latency = latency
+        self.tokens_per_hour = tokens_per_hour
+        self.tokens_per_request = tokens_per_request
+        self.consumed = 0
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _spend(self):
+        with self._lock:
+            self.calls += 1
+            if self.flaky and self.calls % self.flaky == 0:
+                raise api_exceptions.ServiceUnavailable("The service is currently unavailable")
+            if self.consumed + self.tokens_per_request > self.tokens_per_hour:
+                raise api_exceptions.ResourceExhausted("Exhausted property tokens per hour")
+            self.consumed += self.tokens_per_request
+            return self.consumed
+
+    def _quota(self, consumed):
+        return PropertyQuota(
+            tokens_per_hour={"consumed": consumed, "remaining": self.tokens_per_hour - consumed},
+            tokens_per_day={"consumed": consumed, "remaining": self.tokens_per_hour * 5 - consumed},
+        )
+
+    def _rows(self, request):
+        dimensions = [d.name for d in request.dimensions]
+        if len(request.date_ranges) > 1 and "dateRange" not in dimensions:
+            # As GA4 does: every row says which named range it's from
+            dimensions.append("dateRange")
+        metrics = [m.name for m in request.metrics]
+        records = []
+        for date_range in request.date_ranges:
+            days = pd.date_range(date_range.start_date, date_range.end_date).strftime("%Y%m%d")
+            n = len(days) if "date" in dimensions else self.rows
+            for i in range(n):
+                record = {}
+                for name in dimensions:
+                    if name == "date":
+                        record[name] = days[i]
+                    elif name == "dateRange":
+                        record[name] = date_range.name
+                    else:
+                        record[name] = f"{name} {i % max(self.rows, 1)}"
+                for j, name in enumerate(metrics):
+                    value = (i * 7 + j * 3) % 97 + 1
+                    record[name] = value if name in INTEGER_METRICS else value * 1.25
+                records.append(record)
+        if request.order_bys:
+            order = request.order_bys[0]
+            records.sort(key=lambda r: r[order.metric.metric_name], reverse=order.desc)
+        return dimensions, metrics, records
+
+    def _report(self, request, consumed):
+        dimensions, metrics, records = self._rows(request)
+        total = len(records)
+        start = request.offset
+        records = records[start:start + request.limit] if request.limit else records[start:start + 10_000]
+        return RunReportResponse(
+            dimension_headers=[{"name": name} for name in dimensions],
+            metric_headers=[
+                {"name": name, "type_": MetricType.TYPE_INTEGER if name in INTEGER_METRICS else MetricType.TYPE_FLOAT}
+                for name in metrics
+            ],
+            rows=[
+                {
+                    "dimension_values": [{"value": str(r[name])} for name in dimensions],
+                    "metric_values": [{"value": str(r[name])} for name in metrics],
+                }
+                for r in records
+            ],
+            row_count=total,
+            property_quota=self._quota(consumed) if request.return_property_quota else None,
+        )
+
+    def run_report(self, request, **kwargs):
+        time.sleep(self.latency)
+        return self._report(request, self._spend())
+
+    def batch_run_reports(self, request, **kwargs):
+        time.sleep(self.latency)
+        consumed = self._spend()
+        return BatchRunReportsResponse(reports=[self._report(r, consumed) for r in request.requests])
+
+
+class FakeSearchConsole:
+
+    def __init__(self, rows=200, latency=0.0, qps=None):
+        self.rows = rows
+        self.latency = latency
+        self.qps = qps
+        self.calls = 0
+        self._recent = []
+        self._lock = threading.Lock()
+        # clients.registry.gsc_http builds its per-thread pool from this
+        self._http = SimpleNamespace(credentials=None)
+
+    def searchanalytics(self):
+        return self
+
+    def query(self, siteUrl, body):
+        return SimpleNamespace(execute=lambda http=None, **kwargs: self._execute(body))
+
+    def _execute(self, body):
+        time.sleep(self.latency)
+        with self._lock:
+            self.calls += 1
+            now = time.monotonic()
+            self._recent = [t for t in self._recent if now - t < 1] + [now]
+            if self.qps and len(self._recent) > self.qps:
+                raise HttpError(httplib2.Response({"status": 429}), b'{"error": {"code": 429}}')
+        dimensions = body.get("dimensions", [])
+        days = pd.date_range(body["startDate"], body["endDate"]).strftime("%Y-%m-%d")
+        n = len(days) if dimensions == ["date"] else self.rows
+        rows = [
+            {
+                "keys": [days[i % len(days)] if d == "date" else f"{d} {i}" for d in dimensions],
+                "clicks": (i * 5) % 60,
+                "impressions": (i * 37) % 900 + 60,
+                "ctr": ((i * 5) % 60) / ((i * 37) % 900 + 60),
+                "position": 1 + (i % 30) * 0.5,
+            }
+            for i in range(n)
+        ]
+        start = body.get("startRow", 0)
+        return {"rows": rows[start:start + body.get("rowLimit", 1000)]}
@@ -0,0 +1,42 @@
+import datetime
+
+import streamlit as st
+
+# "As of" line for pages rendered from cached data. When some of it was
+# stale and is being refetched in the background, a small polling fragment
+# waits for the refresh and reruns the page once fresh data has landed. If
+# every refresh fails, the page is rerun once to stop the polling and says
+# the data is still stale.
+
+POLL_INTERVAL = 2
+
+
+def as_of_caption(freshness):
+    # freshness: reports.Freshness for this render
+    if freshness.deferred:
+        st.warning("The Google API quota has run out for now, so this page shows stored data. Recent days may be missing until it recovers.")
+    if freshness.as_of is None:
+        return
+    as_of = datetime.datetime.fromtimestamp(freshness.as_of)
+    if freshness.pending and st.session_state.get("_refresh_failed") == freshness.as_of:
+        # The same stale data as when the last refresh failed: no polling
+        st.caption(
+            f"Showing data as of {as_of:%d %b %H:%M}. It couldn't be refreshed just now, "
+            "and will be tried again when you next change the page."
+        )
+    elif freshness.pending:
+        st.caption(f"Showing data as of {as_of:%d %b %H:%M}, refreshing in the background…")
+        _await_refresh(freshness)
+    else:
+        st.caption(f"Data as of {as_of:%d %b %H:%M}")
+
+
+@st.fragment(run_every=POLL_INTERVAL)
+def _await_refresh(freshness):
+    if freshness.refreshed():
+        st.rerun(scope="app")
+    elif not freshness.refreshing():
+        # Every refresh failed (e.g. deferred for quota). Only a full rerun
+        # that leaves this fragment out stops it polling.
+        st.session_state._refresh_failed = freshness.as_of
+        st.rerun(scope="app")
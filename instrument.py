@@ -0,0 +1,177 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import numpy as np
+
+import memory
+
+# Per-section timing and API accounting for the dashboard pages. A page
+# wraps its fetches, frame building and chart building in sections; each
+# section records wall time, rows and bytes produced, report cache hits /
+# stale hits / misses and upstream API calls made on its behalf (counted
+# where they happen, in reports and rate_limit, via a context variable
+# that executor and streaming carry into their worker threads).
+#
+# Every rerun is appended to a JSON-lines log, and recent timings are kept
+# per section across all sessions for the p50/p95 in the diagnostics panel.
+
+LOG_PATH = os.environ.get(
+    "DASHBOARD_DIAGNOSTICS_LOG",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "diagnostics.jsonl"),
+)
+LOG_MAX_BYTES = 10 * 2**20
+# Timings kept per section for the percentiles
+HISTORY = 500
+
+COUNTERS = ("cache_hits", "stale_hits", "cache_misses", "upstream_calls")
+
+
+class Span:
+
+    def __init__(self, name):
+        self.name = name
+        self.wall = 0.0
+        self.rows = None
+        self.bytes = None
+        self.counts = dict.fromkeys(COUNTERS, 0)
+
+    def record(self, result):
+        # rows/bytes of whatever the section produced: a frame, a dict of
+        # frames (the planner's) or anything with a length
+        values = result.values() if isinstance(result, dict) else [result]
+        values = [v for v in values if v is not None]
+        self.rows = sum(len(v) for v in values if hasattr(v, "__len__"))
+        self.bytes = memory.nbytes(values)
+
+    def as_dict(self):
+        return {"section": self.name, "wall_ms": round(self.wall * 1000, 2), "rows": self.rows, "bytes": self.bytes, **self.counts}
+
+
+class Run:
+
+    def __init__(self, page, session_id):
+        self.page = page
+        self.session_id = session_id
+        self.started = time.time()
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+
+_run = ContextVar("instrument_run", default=None)
+_span = ContextVar("instrument_span", default=None)
+
+_history = {}
+_history_lock = threading.Lock()
+_log_lock = threading.Lock()
+
+
+def start_run(page):
+    # Call at the top of a page script; sections until finish_run() belong
+    # to this rerun
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+    ctx = get_script_run_ctx()
+    run = Run(page, ctx.session_id if ctx else None)
+    _run.set(run)
+    return run
+
+
+def finish_run():
+    run = _run.get()
+    if run is None:
+        return
+    _run.set(None)
+    total = Span(f"{run.page}.total")
+    total.wall = time.time() - run.started
+    for span in run.spans:
+        for name in COUNTERS:
+            total.counts[name] += span.counts[name]
+    _remember(total)
+    _log({
+        "ts": run.started,
+        "page": run.page,
+        "session": run.session_id,
+        "total": total.as_dict(),
+        "sections": [span.as_dict() for span in run.spans],
+    })
+
+
+@contextmanager
+def section(name):
+    span = Span(name)
+    token = _span.set(span)
+    started = time.perf_counter()
+    try:
+        yield span
+    finally:
+        span.wall = time.perf_counter() - started
+        _span.reset(token)
+        _remember(span)
+        run = _run.get()
+        if run is not None:
+            run.add(span)
+        else:
+            # A fragment rerunning on its own
+            _log({"ts": time.time(), "page": None, "sections": [span.as_dict()]})
+
+
+def count(name, n=1):
+    # Charge `n` of a counter to the innermost section, if any
+    span = _span.get()
+    if span is not None:
+        span.counts[name] += n
+
+
+def timed(fetches, page):
+    # {name: fetch} for executor.fetch_all, each fetch in its own section
+    def wrap(name, fetch):
+        def run():
+            with section(f"{page}.fetch.{name}") as span:
+                result = fetch()
+                span.record(result)
+            return result
+        return run
+    return {name: wrap(name, fetch) for name, fetch in fetches.items()}
+
+
+def _remember(span):
+    with _history_lock:
+        _history.setdefault(span.name, deque(maxlen=HISTORY)).append(span)
+
+
+def summary():
+    # [{section, n, p50_ms, p95_ms, and the latest rows/bytes/counters}]
+    with _history_lock:
+        history = {name: list(spans) for name, spans in _history.items()}
+    rows = []
+    for name, spans in sorted(history.items()):
+        p50, p95 = np.percentile([span.wall * 1000 for span in spans], [50, 95])
+        latest = spans[-1].as_dict()
+        rows.append({
+            "section": name,
+            "n": len(spans),
+            "p50_ms": round(p50, 1),
+            "p95_ms": round(p95, 1),
+            **{key: latest[key] for key in ("rows", "bytes", *COUNTERS)},
+        })
+    return rows
+
+
+def _log(record):
+    if not LOG_PATH:
+        return
+    line = json.dumps(record, default=str) + "\n"
+    with _log_lock:
+        os.makedirs(os.path.dirname(LOG_PATH) or ".", exist_ok=True)
+        if os.path.exists(LOG_PATH) and os.path.getsize(LOG_PATH) > LOG_MAX_BYTES:
+            os.replace(LOG_PATH, LOG_PATH + ".1")
+        with open(LOG_PATH, "a") as f:
+            f.write(line)
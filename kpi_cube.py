@@ -0,0 +1,203 @@
+import datetime
+import threading
+import weakref
+from dataclasses import replace
+
+import numpy as np
+import pandas as pd
+
+import reports
+from rate_limit import QuotaDeferred
+
+# Pre-aggregated KPI cube. Facts are kept per (day, *dimensions), e.g.
+# (date, itemCategory, itemName), with metric sums and a row count. On every
+# update the cube builds prefix sums over the day axis, for the totals and
+# for each value of the rollup dimension. Range totals and category rollups
+# are then two lookups and a subtraction, whatever range the sidebar asks
+# for. New days are merged in as they arrive. Days still settling are
+# refetched, like the daily store does, and nothing else is.
+
+COUNT = "count"
+
+
+class KPICube:
+
+    def __init__(self, dimensions, metrics, rollup, settling_days=reports.SETTLING_DAYS):
+        # dimensions: non-date dimensions of the facts; rollup: the one of
+        # them with precomputed per-value sums
+        self.dimensions = list(dimensions)
+        self.metrics = list(metrics)
+        self.rollup = rollup
+        self.settling_days = settling_days
+        self.facts = pd.DataFrame({
+            "date": pd.Series(dtype="datetime64[ns]"),
+            **{d: pd.Series(dtype=object) for d in self.dimensions},
+            **{m: pd.Series(dtype=float) for m in self.metrics},
+            COUNT: pd.Series(dtype="int64"),
+        })
+        self._fetched_on = {}
+        self._merged = {}
+        # Bumped by every merge
+        self.version = 0
+        self._lock = threading.Lock()
+        self._build()
+
+    def __len__(self):
+        return len(self.facts)
+
+    def nbytes(self):
+        return int(self.facts.memory_usage(deep=True).sum() + self._totals.nbytes + self._rollups.nbytes)
+
+    def missing_range(self, start, end):
+        # Smallest contiguous range covering every day that isn't final yet
+        days = pd.date_range(start, end, freq="D")
+        with self._lock:
+            needed = [
+                day for day in days
+                if self._fetched_on.get(day) is None
+                or self._fetched_on[day] < (day + datetime.timedelta(days=self.settling_days)).date()
+            ]
+        if not needed:
+            return None
+        return needed[0].strftime("%Y-%m-%d"), needed[-1].strftime("%Y-%m-%d")
+
+    def merge(self, start, end, df, fetched_at):
+        # Replace days start..end with the rows of `df` (a decoded report
+        # with a 'date' column) fetched from upstream at fetched_at. The
+        # same frame is only merged once, so a delta served from the report
+        # cache on every rerun costs nothing.
+        # Only a weak reference to it is kept: the report cache decides how
+        # long the frame lives.
+        span = (start, end)
+        with self._lock:
+            merged = self._merged.get(span)
+            if merged is not None and merged() is df:
+                return
+        grouped = (
+            df.groupby(["date", *self.dimensions], sort=False, observed=True, dropna=False)[self.metrics]
+            .agg(["sum", "count"])
+        )
+        facts = grouped.xs("sum", axis=1, level=1).copy()
+        facts[COUNT] = grouped[(self.metrics[0], "count")].astype("int64")
+        facts = facts.reset_index()
+
+        fetched_on = datetime.date.fromtimestamp(fetched_at)
+        days = pd.date_range(start, end, freq="D")
+        with self._lock:
+            kept = self.facts[~self.facts["date"].between(days[0], days[-1])]
+            if len(kept):
+                facts = pd.concat([kept, facts], ignore_index=True)
+                # Concatenating categoricals with different values gives objects
+                for name in self.dimensions:
+                    facts[name] = facts[name].astype("category")
+            self.facts = facts.sort_values("date", ignore_index=True)
+            for day in days:
+                self._fetched_on[day] = fetched_on
+            if days[-1].date() + datetime.timedelta(days=self.settling_days) > fetched_on:
+                # Still settling, so the span will be asked for again
+                self._merged[span] = weakref.ref(df)
+            # Spans that have settled since won't be asked for again
+            self._merged = {
+                merged_span: ref for merged_span, ref in self._merged.items()
+                if ref() is not None
+                and pd.Timestamp(merged_span[1]).date() + datetime.timedelta(days=self.settling_days) > fetched_on
+            }
+            self._build()
+            self.version += 1
+
+    def _build(self):
+        # Prefix sums over every fetched day; row i holds the sums for all
+        # days before self._days[i]
+        self._days = pd.DatetimeIndex(sorted(self._fetched_on))
+        values = self.metrics + [COUNT]
+        by_day = self.facts.groupby("date")[values].sum().reindex(self._days, fill_value=0)
+        self._totals = np.vstack([np.zeros(len(values)), by_day.to_numpy(dtype=float).cumsum(axis=0)])
+
+        by_rollup = self.facts.pivot_table(
+            index="date", columns=self.rollup, values=values, aggfunc="sum", fill_value=0, observed=True,
+        ).reindex(self._days, fill_value=0)
+        self._rollup_columns = by_rollup.columns
+        self._rollups = np.vstack([
+            np.zeros(len(by_rollup.columns)),
+            by_rollup.to_numpy(dtype=float).cumsum(axis=0),
+        ])
+
+    def _bounds(self, start, end):
+        return (
+            self._days.searchsorted(pd.Timestamp(start), side="left"),
+            self._days.searchsorted(pd.Timestamp(end), side="right"),
+        )
+
+    def totals(self, start, end):
+        # pd.Series of metric sums (plus 'count') over start..end
+        with self._lock:
+            i, j = self._bounds(start, end)
+            sums = self._totals[j] - self._totals[i]
+        return pd.Series(sums, index=self.metrics + [COUNT])
+
+    def rollups(self, start, end):
+        # One row per rollup value, metric sums (plus 'count') over start..end
+        with self._lock:
+            i, j = self._bounds(start, end)
+            sums = pd.Series(self._rollups[j] - self._rollups[i], index=self._rollup_columns)
+        if sums.empty:
+            return pd.DataFrame(columns=self.metrics + [COUNT]).rename_axis(self.rollup)
+        return sums.unstack(level=0).reindex(columns=self.metrics + [COUNT])
+
+    def ensure(self, ranges, fetch):
+        # Bring every (start, end) range up to date; fetch(start, end)
+        # returns the report rows for that span and when they were fetched
+        # (reports.fetched_at). Overlapping deltas are fetched as one span.
+        deltas = sorted(filter(None, (self.missing_range(start, end) for start, end in ranges)))
+        spans = []
+        for start, end in deltas:
+            if spans and pd.Timestamp(start) <= pd.Timestamp(spans[-1][1]) + pd.Timedelta(days=1):
+                spans[-1] = (spans[-1][0], max(spans[-1][1], end))
+            else:
+                spans.append((start, end))
+        for span in spans:
+            try:
+                self.merge(*span, *fetch(*span))
+            except QuotaDeferred:
+                # Quota is low: answer from what the cube has and catch up later
+                reports.note_deferred()
+        return self
+
+
+# Cubes live in the shared report cache, next to the reports they're built
+# from, so they count against its byte budget and the least recently used
+# ones are evicted like any report. One that's evicted (or unused for
+# CUBE_TTL) is rebuilt from the reports on its next use.
+CUBE_TTL = reports.HISTORICAL_TTL
+_cubes_lock = threading.Lock()
+
+
+def _stamped(client, report):
+    df = reports.run_report(client, report)
+    return df, reports.fetched_at(report, df)
+
+
+def ga4_cube(client, report, ranges, rollup):
+    # One cube per report shape (everything but the dates), shared by all
+    # sessions. `report` has a 'date' dimension plus the cube's dimensions;
+    # its own dates are ignored, `ranges` decide which days get covered.
+    if "date" not in report.dimensions:
+        raise ValueError("ga4_cube needs a report with a 'date' dimension")
+    key = "cube:" + replace(report, start_date="", end_date="").key()
+    with _cubes_lock:
+        cube = reports.report_cache.get(key)
+        if cube is None:
+            dimensions = [d for d in report.dimensions if d != "date"]
+            cube = KPICube(dimensions, report.metrics, rollup)
+            reports.report_cache.put(key, cube, CUBE_TTL)
+    version = cube.version
+    cube.ensure(
+        ranges,
+        lambda start, end: _stamped(client, replace(report, start_date=start, end_date=end)),
+    )
+    if cube.version != version:
+        # It has grown: stored again so the cache counts its new size
+        with _cubes_lock:
+            if reports.report_cache.stored_at(key, cube) is not None:
+                reports.report_cache.put(key, cube, CUBE_TTL)
+    return cube
@@ -0,0 +1,42 @@
+import sys
+
+import numpy as np
+import pandas as pd
+
+# Rough in-memory sizes of what the dashboard holds on to, for the report
+# cache's byte budget and the per-session readout in the sidebar.
+
+
+def nbytes(value, _seen=None):
+    # Deep size of frames, series and arrays, including inside dicts, lists
+    # and tuples. Objects reached twice are counted once.
+    seen = set() if _seen is None else _seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, (pd.Series, pd.Index)):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if callable(getattr(value, "nbytes", None)):
+        # Objects that know their own size (kpi_cube.KPICube)
+        return value.nbytes()
+    if isinstance(value, dict):
+        return sum(nbytes(v, seen) for v in value.values())
+    if isinstance(value, (list, tuple, set)):
+        return sum(nbytes(v, seen) for v in value)
+    return sys.getsizeof(value)
+
+
+def session_bytes(session_state):
+    return nbytes(session_state.to_dict())
+
+
+def format_bytes(n):
+    for unit in ("B", "KB", "MB"):
+        if n < 1024:
+            return f"{n:,.0f} {unit}" if unit == "B" else f"{n:,.1f} {unit}"
+        n /= 1024
+    return f"{n:,.1f} GB"
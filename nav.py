@@ -1,18 +1,29 @@
+import os
 import streamlit as st
 from time import sleep
 from streamlit.runtime.scriptrunner import get_script_run_ctx
-from streamlit.source_util import get_pages
 
-st.logo("assets/whd_logo.png")
+# The login page imports this module, so it stays light: the reporting
+# stack (pandas, the Google clients) is imported by the logged-in sidebar
+# on first use.
+
+# Usernames that get the diagnostics panel, comma separated
+ADMINS = {name.strip() for name in os.environ.get("DASHBOARD_ADMINS", "").split(",") if name.strip()}
+
+# Page names by script hash, resolved once per process rather than on
+# every render (pages/ doesn't change while the server runs)
+_page_names = {}
 
 def get_current_page_name():
     ctx = get_script_run_ctx()
     if ctx is None:
         raise RuntimeError("Couldn't get script context")
 
-    pages = get_pages("")
+    if ctx.page_script_hash not in _page_names:
+        pages = ctx.pages_manager.get_pages()
+        _page_names.update({page_hash: page["page_name"] for page_hash, page in pages.items()})
 
-    return pages[ctx.page_script_hash]["page_name"]
+    return _page_names[ctx.page_script_hash]
 
 
 def make_sidebar():
@@ -24,6 +35,7 @@ def make_sidebar():
         if st.session_state.get("logged_in", False):
             st.page_link("pages/sales.py", label="Sales", icon=":material/bar_chart:")
             st.page_link("pages/seo.py", label="SEO Performance", icon=":material/bar_chart:")
+            st.page_link("pages/export.py", label="Export", icon=":material/download:")
 
             st.write("")
             st.write("")
@@ -31,12 +43,47 @@ def make_sidebar():
             if st.button("Log out"):
                 logout()
 
+            import memory
+            import reports
+
+            cache = reports.report_cache.stats()
+            st.caption(
+                f"Session memory: {memory.format_bytes(memory.session_bytes(st.session_state))}  \n"
+                f"Shared report cache: {memory.format_bytes(cache['bytes'])} "
+                f"of {memory.format_bytes(cache['max_bytes'])}"
+            )
+
+            if st.session_state.get("username") in ADMINS:
+                diagnostics_panel()
+
         elif get_current_page_name() != "app":
             # If anyone tries to access a secret page without being logged in,
             # redirect them to the login page
             st.switch_page("app.py")
 
 
+def diagnostics_panel():
+    # Section timings across every session since the server started, and
+    # the shared fetch layer's counters
+    import executor
+    import instrument
+    import reports
+    import streaming
+    from rate_limit import limiter
+    from singleflight import flights
+
+    with st.expander("Diagnostics"):
+        st.caption("Per section: p50/p95 wall time, latest rows, bytes, cache and upstream calls")
+        st.dataframe(instrument.summary(), hide_index=True)
+        st.json({
+            "report_cache": reports.report_cache.stats(),
+            "single_flight": flights.stats(),
+            "rate_limit": limiter.stats(),
+            "fetch_pool": executor.stats(),
+            "prefetch_pool": streaming.stats(),
+        }, expanded=False)
+
+
 def logout():
     st.session_state.logged_in = False
     st.info("Logged out successfully!")
@@ -0,0 +1,147 @@
+import daily_store
+import kpi_cube
+import planner
+import rate_limit
+import reports
+from reports import GA4Report, GSCQuery
+
+# The reports behind each dashboard page, for a (current, compared) pair of
+# date ranges. Pages render from these and the cache warmer prefetches the
+# same definitions, so warmed entries are exactly the ones a page asks for.
+
+# Google Analytics property ID
+PROPERTY_ID = "389980673"
+GSC_SITE_URL = "https://linfieldconstruction.co.uk/"
+
+# Sidebar date_input defaults (the end dates default to today)
+DEFAULT_START = "2024-01-18"
+
+
+# Sales page
+
+def daily_items_report(start_date, end_date):
+    # Item sales per day, the facts behind the KPI cube
+    return GA4Report(
+        property_id=PROPERTY_ID,
+        dimensions=["date", "itemCategory", "itemName"],
+        metrics=["itemsViewed", "itemsPurchased", "itemRevenue"],
+        start_date=start_date,
+        end_date=end_date,
+        priority=rate_limit.CRITICAL,
+    )
+
+def daily_sales_report(start_date, end_date):
+    return GA4Report(
+        property_id=PROPERTY_ID,
+        dimensions=["date"],
+        metrics=["purchaseRevenue"],
+        start_date=start_date,
+        end_date=end_date,
+    )
+
+def top_products_report(start_date, end_date):
+    return reports.ranked(GA4Report(
+        property_id=PROPERTY_ID,
+        dimensions=["itemName", "itemCategory"],
+        metrics=["itemsPurchased"],
+        start_date=start_date,
+        end_date=end_date,
+        priority=rate_limit.LOW,
+    ), "itemsPurchased", 10)
+
+
+# SEO page
+
+def organic_report(start_date, end_date):
+    return GA4Report(
+        property_id=PROPERTY_ID,
+        dimensions=["sessionDefaultChannelGroup"],
+        metrics=["activeUsers", "newUsers", "engagedSessions"],
+        start_date=start_date,
+        end_date=end_date,
+        filters=[("sessionDefaultChannelGroup", "Organic Search")],
+        priority=rate_limit.CRITICAL,
+    )
+
+def daily_sessions_report(start_date, end_date):
+    return GA4Report(
+        property_id=PROPERTY_ID,
+        dimensions=["date"],
+        metrics=["sessions"],
+        start_date=start_date,
+        end_date=end_date,
+    )
+
+def landing_pages_report(start_date, end_date):
+    return reports.ranked(GA4Report(
+        property_id=PROPERTY_ID,
+        dimensions=["landingPage"],
+        metrics=["activeUsers", "newUsers", "engagedSessions"],
+        start_date=start_date,
+        end_date=end_date,
+        priority=rate_limit.LOW,
+    ), "activeUsers", 10)
+
+def daily_gsc_query(start_date, end_date):
+    return GSCQuery(
+        site_url=GSC_SITE_URL,
+        start_date=start_date,
+        end_date=end_date,
+    )
+
+
+# Google Ads page
+
+def daily_paid_search_report(start_date, end_date):
+    return GA4Report(
+        property_id=PROPERTY_ID,
+        dimensions=["date"],
+        metrics=["sessions", "engagedSessions"],
+        start_date=start_date,
+        end_date=end_date,
+        filters=[("sessionDefaultChannelGroup", "Paid Search")],
+    )
+
+
+# Fetch plans: {name: zero-argument callable} for executor.fetch_all.
+# "ga4" returns {report name: DataFrame} from the planner, "cube" the KPI
+# cube covering both ranges, and the daily series come from the local
+# store. current/compared are (start, end) date strings.
+
+# Fetches served from the on-disk daily store, so they outlive the process
+# that made them (the rest live in this process's report cache and cubes)
+STORED_FETCHES = {
+    "daily_current", "daily_compared",
+    "sessions_current", "sessions_compared",
+    "gsc_current", "gsc_compared",
+}
+
+def sales_fetches(client, current, compared):
+    ga4_reports = {
+        "top_products": top_products_report(*current),
+    }
+    return {
+        "cube": lambda: kpi_cube.ga4_cube(client, daily_items_report(*current), [current, compared], "itemCategory"),
+        "ga4": lambda: planner.run_reports(client, ga4_reports),
+        "daily_current": lambda: daily_store.ga4_daily(client, daily_sales_report(*current)),
+        "daily_compared": lambda: daily_store.ga4_daily(client, daily_sales_report(*compared)),
+    }
+
+def seo_fetches(client, gsc_service, current, compared):
+    ga4_reports = {
+        "ga_current": organic_report(*current),
+        "ga_compared": organic_report(*compared),
+        "top_landing_pages": landing_pages_report(*current),
+    }
+    return {
+        "ga4": lambda: planner.run_reports(client, ga4_reports),
+        "sessions_current": lambda: daily_store.ga4_daily(client, daily_sessions_report(*current)),
+        "sessions_compared": lambda: daily_store.ga4_daily(client, daily_sessions_report(*compared)),
+        "gsc_current": lambda: daily_store.gsc_daily(gsc_service, daily_gsc_query(*current)),
+        "gsc_compared": lambda: daily_store.gsc_daily(gsc_service, daily_gsc_query(*compared)),
+    }
+
+def google_ads_fetches(client, current):
+    return {
+        "paid_search": lambda: daily_store.ga4_daily(client, daily_paid_search_report(*current)),
+    }
@@ -0,0 +1,98 @@
+import datetime
+import os
+import pandas as pd
+import streamlit as st
+from streamlit.web.server.app_static_file_handler import MAX_APP_STATIC_FILE_SIZE
+from nav import make_sidebar
+import clients
+import export
+import instrument
+import memory
+import rate_limit
+
+# Logged-out visitors are sent back to the login page before anything else runs
+st.logo("assets/whd_logo.png")
+make_sidebar()
+
+# Time every section of this rerun (see the diagnostics panel)
+instrument.start_run("export")
+
+client = clients.ga4_client(st.secrets["ga4_service_account"])
+gsc_service = clients.gsc_service(st.secrets["gsc_service_account"])
+
+# Deletes exports once they expire, including ones from earlier processes
+export.start_pruner()
+
+st.title("⬇️ Export Reports")
+st.write(
+    "Pull a report, for any number of properties and date ranges, into a single Parquet or CSV file. "
+    "Rows are written to the file as they arrive, so there's no limit on the size of the export."
+)
+
+today = datetime.date.today()
+
+with st.form("export"):
+    name = st.selectbox("Report", list(export.REPORTS), format_func=lambda name: export.REPORTS[name][0])
+    ranges = st.data_editor(
+        pd.DataFrame({"Start": [today - datetime.timedelta(days=29)], "End": [today]}),
+        num_rows="dynamic",
+        column_config={
+            "Start": st.column_config.DateColumn("Start", required=True),
+            "End": st.column_config.DateColumn("End", required=True),
+        },
+        key="export_ranges",
+    )
+    properties = st.text_input(
+        "GA4 properties or Search Console sites",
+        placeholder="The dashboard's own; separate several with commas",
+    )
+    fmt = st.radio("Format", export.FORMATS, format_func=str.capitalize, horizontal=True)
+    submitted = st.form_submit_button("Export")
+
+if submitted:
+    ranges = [
+        (start.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d"))
+        for start, end in ranges.dropna().itertuples(index=False)
+    ]
+    if not ranges:
+        st.error("Add at least one date range.")
+    elif any(start > end for start, end in ranges):
+        st.error("Each range has to start on or before its end date.")
+    else:
+        properties = [p.strip() for p in properties.split(",") if p.strip()]
+        with st.status("Exporting...") as status, instrument.section("export.write"):
+            try:
+                path, rows = export.export(
+                    client, gsc_service, name, ranges, properties, fmt=fmt,
+                    progress=lambda rows: status.update(label=f"Exporting... {rows:,} rows written"),
+                )
+            except rate_limit.QuotaDeferred:
+                status.update(label="Export paused", state="error")
+                st.warning("Exports are paused while the GA4 quota is running low. Try again later.")
+            else:
+                status.update(label=f"Exported {rows:,} rows", state="complete")
+                st.session_state.last_export = path
+
+# The last export, until it expires
+path = st.session_state.get("last_export")
+if path and os.path.exists(path):
+    size = os.path.getsize(path)
+    filename = os.path.basename(path)
+    if size > MAX_APP_STATIC_FILE_SIZE:
+        st.warning(
+            f"{filename} is {memory.format_bytes(size)}, over the {memory.format_bytes(MAX_APP_STATIC_FILE_SIZE)} "
+            "download limit. Export fewer ranges, use Parquet, or run it headless with export.py."
+        )
+    else:
+        # Served from disk by Streamlit's static file handler, a chunk at a time
+        st.markdown(
+            f'<a href="{export.url(path)}" download="{filename}">Download {filename}</a> '
+            f'({memory.format_bytes(size)})',
+            unsafe_allow_html=True,
+        )
+        st.caption(
+            f"The link works for {export.EXPORT_TTL // 60} minutes, and for anyone who has it: "
+            "no login is needed to download the file, so only share it with people who may see the data."
+        )
+
+instrument.finish_run()
@@ -1,23 +1,41 @@
-import streamlit as st
-from streamlit_echarts import st_echarts
 import datetime
+import streamlit as st
 from nav import make_sidebar
+import clients
+import executor
+import freshness
+import instrument
+import page_reports
+import range_chart
+import reports
 
 st.logo("assets/whd_logo.png")
 
+# Logged-out visitors are sent back to the login page before anything else runs
 make_sidebar()
 
+# Time every section of this rerun (see the diagnostics panel)
+instrument.start_run("google_ads")
+
+client = clients.ga4_client(st.secrets["ga4_service_account"])
+
 
 st.write("Your Dashboard")
 
-option = {
-    "xAxis": {
-        "type": "category",
-        "data": ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"],
-    },
-    "yAxis": {"type": "value"},
-    "series": [{"data": [820, 932, 901, 934, 1290, 1330, 1320], "type": "line"}],
-}
-st_echarts(
-    options=option, height="400px",
-)
\ No newline at end of file
+# The whole history is indexed once; the chart opens on the last 90 days
+# and its slider scrubs through the rest without refetching
+today = datetime.date.today()
+history = (page_reports.DEFAULT_START, today.strftime("%Y-%m-%d"))
+
+served = reports.track_freshness()
+results = executor.fetch_all(instrument.timed(page_reports.google_ads_fetches(client, history), "google_ads"))
+freshness.as_of_caption(served)
+
+with instrument.section("google_ads.paid_search.render"):
+    range_chart.range_chart(
+        results["paid_search"], "date", ["sessions", "engagedSessions"],
+        key="paid_search", window=(today - datetime.timedelta(days=89), today),
+        title="Paid search sessions", height="400px",
+    )
+
+instrument.finish_run()
@@ -4,271 +4,194 @@ import pandas as pd
 import streamlit as st
 import altair as alt
 import numpy as np
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
-from google.analytics.data_v1beta import BetaAnalyticsDataClient
-from google.analytics.data_v1beta.types import (
-    DateRange,
-    Filter,
-    FilterExpression,
-    Dimension,
-    Metric,
-    RunReportRequest,
-)
+import analytics
+import clients
+import downsample
+import executor
+import freshness
+import instrument
+import page_reports
+import table_view
+import reports
+
+# Streamlit Setup (logged-out visitors are sent back to the login page
+# before anything else runs)
+st.logo("assets/whd_logo.png")
+make_sidebar()
+
+# Time every section of this rerun (see the diagnostics panel)
+instrument.start_run("sales")
 
 # Initialize GA4 client
-ga4_credentials = service_account.Credentials.from_service_account_info(
-    st.secrets["ga4_service_account"],
-    scopes=["https://www.googleapis.com/auth/analytics.readonly"]
-)
-client = BetaAnalyticsDataClient(credentials=ga4_credentials)
+client = clients.ga4_client(st.secrets["ga4_service_account"])
 
-# Streamlit Setup
-st.logo("assets/whd_logo.png")
-make_sidebar()
 st.title("📊 Product Sales Dashboard")
 st.divider()
 st.sidebar.header("Select Date Range here👇")
 
-# Google Analytics property ID
-property_id = "389980673"
-
 # Date range sidebar
-start_date_current = st.sidebar.date_input("Start date of current month", pd.to_datetime("2024-01-18"))
+start_date_current = st.sidebar.date_input("Start date of current month", pd.to_datetime(page_reports.DEFAULT_START))
 end_date_current = st.sidebar.date_input("End date of current month", pd.to_datetime("today"))
-start_date_compared = st.sidebar.date_input("Start date of month to compare", pd.to_datetime("2024-01-18"))
+start_date_compared = st.sidebar.date_input("Start date of month to compare", pd.to_datetime(page_reports.DEFAULT_START))
 end_date_compared = st.sidebar.date_input("End date of month to compare", pd.to_datetime("today"))
 
 
 
-# Date Sales data
-def fetch_sales_data(date_range, date_label):
-    request = RunReportRequest(
-        property=f"properties/{property_id}",
-        dimensions=[
-            Dimension(name="itemName"),
-            Dimension(name="itemCategory")
-        ],
-        metrics=[
-            Metric(name="itemsViewed"),
-            Metric(name="itemsPurchased"),
-            Metric(name="itemRevenue"),
-            Metric(name="purchaseToViewRate")
-        ],
-        date_ranges=[date_range]
-    )
-    response = client.run_report(request)
-    data = []
-    for row in response.rows:
-        data.append({
-            'Date Range': date_label,
-            'Product': row.dimension_values[0].value,
-            'Category': row.dimension_values[1].value,
-            'Views': int(row.metric_values[0].value),
-            'Items Sold': int(row.metric_values[1].value),
-            'Revenue': float(row.metric_values[2].value),
-            'Conversion Rate': float(row.metric_values[3].value) * 100
-        })
-    return data
-
-# Fetch and combine data
-combined_data = fetch_sales_data(
-    DateRange(start_date=start_date_current.strftime("%Y-%m-%d"), end_date=end_date_current.strftime("%Y-%m-%d")), 
-    start_date_current.strftime('%B %Y')
-)
-combined_data += fetch_sales_data(
-    DateRange(start_date=start_date_compared.strftime("%Y-%m-%d"), end_date=end_date_compared.strftime("%Y-%m-%d")), 
-    start_date_compared.strftime('%B %Y')
-)
-
-# Create DataFrame for combined sales data
-df_combined = pd.DataFrame(combined_data)
-
-def fetch_sales_data(date_range, date_label):
-    request = RunReportRequest(
-        property=f"properties/{property_id}",
-        dimensions=[
-            Dimension(name="itemName"),
-            Dimension(name="itemCategory")
-        ],
-        metrics=[
-            Metric(name="itemsViewed"),
-            Metric(name="totalRevenue"),
-            Metric(name="itemRevenue"),
-            Metric(name="purchaseToViewRate")
-        ],
-        date_ranges=[date_range]
-    )
-    response = client.run_report(request)
-    data = []
-    for row in response.rows:
-        data.append({
-            'Date Range': date_label,
-            'Product': row.dimension_values[0].value,
-            'Category': row.dimension_values[1].value,
-            'Views': int(row.metric_values[0].value),
-            'Items Sold': int(row.metric_values[1].value),
-            'Revenue': float(row.metric_values[2].value),
-            'Conversion Rate': float(row.metric_values[3].value) * 100
-        })
-    return data
-
-
-# Calculate and display summary metrics
-current_month = df_combined[df_combined['Date Range'] == start_date_current.strftime('%B %Y')]
-previous_month = df_combined[df_combined['Date Range'] == start_date_compared.strftime('%B %Y')]
+# The frames below are built once from the fetched frames and kept in the
+# shared report cache (reports.derived), so every session and fragment
+# holds the same copy. Don't modify them in place.
+
+# Daily sales data
+def daily_sales_frame(df):
+    return pd.DataFrame({'Date': df['date'], 'Sales': df['purchaseRevenue']}, copy=False)
+
+# Top selling products data
+def top_products_frame(df):
+    if df is None:
+        return None
+    return pd.DataFrame({
+        'Product': df['itemName'],
+        'Category': df['itemCategory'],
+        'Sales': df['itemsPurchased'].astype(float)
+    }, copy=False)
+
+current_range = (start_date_current.strftime("%Y-%m-%d"), end_date_current.strftime("%Y-%m-%d"))
+compared_range = (start_date_compared.strftime("%Y-%m-%d"), end_date_compared.strftime("%Y-%m-%d"))
+
+# Fetch every report for the page concurrently, GA4 reports planned into as
+# few API calls as possible. Anything cached but stale is shown as it is
+# and refreshed in the background.
+served = reports.track_freshness()
+results = executor.fetch_all(instrument.timed(page_reports.sales_fetches(client, current_range, compared_range), "sales"))
+ga4_results = results["ga4"]
+sales_cube = results["cube"]
+freshness.as_of_caption(served)
+
+
+# Calculate and display summary metrics, looked up from the KPI cube by
+# date range
+with instrument.section("sales.kpi_lookup"):
+    current_month = sales_cube.totals(*current_range)
+    previous_month = sales_cube.totals(*compared_range)
+
+def delta(pct):
+    # st.metric delta; None (no arrow) when there's nothing to compare with
+    return None if np.isnan(pct) else f"{pct:,.1f}%"
 
 metrics_col1, metrics_col2, metrics_col3 = st.columns(3)
 with metrics_col1:
-    current_revenue = current_month['Revenue'].sum()
-    previous_revenue = previous_month['Revenue'].sum()
-    revenue_change = ((current_revenue - previous_revenue) / previous_revenue) * 100
-    st.metric("Revenue", f"£{current_revenue:,.2f}", f"{revenue_change:,.1f}%")
+    current_revenue = current_month['itemRevenue']
+    previous_revenue = previous_month['itemRevenue']
+    st.metric("Revenue", f"£{current_revenue:,.2f}", delta(analytics.change(current_revenue, previous_revenue)))
 
 with metrics_col2:
-    current_units = current_month['Items Sold'].sum()
-    previous_units = previous_month['Items Sold'].sum()
-    units_change = ((current_units - previous_units) / previous_units) * 100
-    st.metric("Items Sold", f"{current_units:,}", f"{units_change:,.1f}%")
+    current_units = int(current_month['itemsPurchased'])
+    previous_units = int(previous_month['itemsPurchased'])
+    st.metric("Items Sold", f"{current_units:,}", delta(analytics.change(current_units, previous_units)))
 
 
 with metrics_col3:
-    current_avg_order = current_revenue / current_units
-    previous_avg_order = previous_revenue / previous_units
-    avg_order_change = ((current_avg_order - previous_avg_order) / previous_avg_order) * 100
-    st.metric("Avg Order Value", f"£{current_avg_order:.2f}", f"{avg_order_change:,.1f}%")
-              
-
-
-# Function to fetch sales data from GA4
-def fetch_sales_data(start_date, end_date):
-    request = RunReportRequest(
-        property=f"properties/{property_id}",
-        dimensions=[Dimension(name="date")],
-        metrics=[Metric(name="purchaseRevenue")],
-        date_ranges=[DateRange(start_date=start_date, end_date=end_date)]
+    current_avg_order = analytics.ratio(current_revenue, current_units)
+    previous_avg_order = analytics.ratio(previous_revenue, previous_units)
+    st.metric(
+        "Avg Order Value",
+        "–" if np.isnan(current_avg_order) else f"£{current_avg_order:.2f}",
+        delta(analytics.change(current_avg_order, previous_avg_order)),
     )
-    response = client.run_report(request)
-    
-    sales_data = [
-        {
-            'Date': pd.to_datetime(row.dimension_values[0].value),
-            'Sales': float(row.metric_values[0].value)
-        }
-        for row in response.rows
-    ]
-    return pd.DataFrame(sales_data)
-
-# Fetch sales data for the selected date range
-df_sales_current = fetch_sales_data(
-    start_date_current.strftime("%Y-%m-%d"), end_date_current.strftime("%Y-%m-%d")
-).assign(DateRange="Current Month")
-
-df_sales_comparison = fetch_sales_data(
-    start_date_compared.strftime("%Y-%m-%d"), end_date_compared.strftime("%Y-%m-%d")
-).assign(DateRange="Comparison Month")
-
-# Combine data for comparison
-df_sales_combined = pd.concat([df_sales_current, df_sales_comparison])
 
 
-# Sales over time chart
-sales_line_chart = alt.Chart(df_sales_combined).mark_line().encode(
-    x=alt.X('Date:T', title='Date'),
-    y=alt.Y('Sales:Q', title='Sales (Revenue)'),
-    color=alt.Color('DateRange:N', title='Date Range')
-).properties(
-    width=700, height=400
-)
-
-st.subheader("Sales Over Time")
-
-# Display the chart
-st.altair_chart(sales_line_chart, use_container_width=True)
-
-
-
-
-# Fetch top selling products data
-def fetch_top_products(start_date, end_date):
-    request = RunReportRequest(
-        property=f"properties/{property_id}",
-        dimensions=[
-            Dimension(name="itemName"),
-            Dimension(name="itemCategory")
-        ],
-        metrics=[
-            Metric(name="itemsPurchased")
-        ],
-        date_ranges=[DateRange(start_date=start_date, end_date=end_date)]
+with instrument.section("sales.frames") as span:
+    # Combine data for comparison
+    df_sales_combined = reports.derived(
+        "sales.daily_combined",
+        [page_reports.daily_sales_report(*current_range), page_reports.daily_sales_report(*compared_range)],
+        lambda: pd.concat([
+            daily_sales_frame(results["daily_current"]).assign(DateRange="Current Month"),
+            daily_sales_frame(results["daily_compared"]).assign(DateRange="Comparison Month"),
+        ]),
     )
-    response = client.run_report(request)
-    data = [
-        {
-            'Product': row.dimension_values[0].value,
-            'Category': row.dimension_values[1].value,
-            'Sales': float(row.metric_values[0].value)
-        }
-        for row in response.rows[:10]
-    ]
-    return pd.DataFrame(data).sort_values('Sales', ascending=False)
+
+    df_top_products = top_products_frame(ga4_results["top_products"])
+    span.record(df_sales_combined)
+
+with instrument.section("sales.trends"):
+    # Computed once per refresh of the daily series, then looked up
+    sales_trends = analytics.trends(results["daily_current"], ["purchaseRevenue"])
+
+
+# Each section below is a fragment: its widgets rerun only that section,
+# against the frames it was given on the last full run, instead of
+# re-running the whole page (and every fetch) top to bottom.
+
+# Sales over time chart
+@st.fragment
+def sales_over_time(df_sales_combined):
+    with instrument.section("sales.sales_over_time.chart") as span:
+        # Long ranges are thinned to about one point per pixel, keeping peaks
+        chart_data = downsample.for_chart(df_sales_combined, 'Date', 'Sales', by='DateRange', max_points=700)
+        sales_line_chart = alt.Chart(chart_data).mark_line().encode(
+            x=alt.X('Date:T', title='Date'),
+            y=alt.Y('Sales:Q', title='Sales (Revenue)'),
+            color=alt.Color('DateRange:N', title='Date Range')
+        ).properties(
+            width=700, height=400
+        )
+        span.record(chart_data)
+
+    st.subheader("Sales Over Time")
+
+    # Display the chart
+    with instrument.section("sales.sales_over_time.render"):
+        st.altair_chart(sales_line_chart, use_container_width=True)
+
+
+# Rolling averages and period-over-period changes as of the end of the
+# current range
+@st.fragment
+def revenue_trends(trends):
+    st.subheader("Revenue Trends")
+    with instrument.section("sales.revenue_trends.render"):
+        st.dataframe(trends.latest().rename(index={"purchaseRevenue": "Revenue"}, columns=analytics.LABELS))
+
 
 # Display top selling products
-df_top_products = fetch_top_products(
-    start_date_current.strftime("%Y-%m-%d"),
-    end_date_current.strftime("%Y-%m-%d")
-)
-st.subheader("Top 10 Products by Revenue")
-st.dataframe(df_top_products)
+@st.fragment
+def top_products(df_top_products):
+    st.subheader("Top 10 Products by Revenue")
+    if df_top_products is None:
+        st.info("Top products are paused while the GA4 quota is running low.")
+    else:
+        with instrument.section("sales.top_products.render"):
+            st.dataframe(df_top_products)
 
 
 # Revenue by Category Test
 
-st.subheader("Revenue By Category")
-
-def create_revenue_table(df):
-    revenue_table = df.groupby('Category').agg(
-        Revenue=('Revenue', 'sum')
-    ).reset_index()
+def create_revenue_table(categories):
+    # categories: the cube's per-category rollup for the range
+    revenue_table = pd.DataFrame({
+        'Category': categories.index,
+        'Revenue': categories['itemRevenue'].to_numpy(),
+    })
     revenue_table = revenue_table.dropna(subset=['Category'])
     revenue_table = revenue_table[revenue_table['Category'] != '']
     # Sort by Revenue in descending order
     revenue_table = revenue_table.sort_values('Revenue', ascending=False)
     return revenue_table
 
-@st.cache_data(show_spinner=False)
-def split_frame(input_df, rows):
-    df_batches = [input_df.iloc[i:i + rows] for i in range(0, len(input_df), rows)]
-    return df_batches
-
-revenue_table = create_revenue_table(df_combined)
+@st.fragment
+def revenue_by_category(revenue_table):
+    st.subheader("Revenue By Category")
+    with instrument.section("sales.revenue_by_category.render"):
+        table_view.paginated_table(revenue_table, key="revenue_table", sort_by="Revenue")
 
-if "page_size" not in st.session_state:
-    st.session_state.page_size = 10
-if "current_page" not in st.session_state:
-    st.session_state.current_page = 1
 
-batch_size = st.session_state.page_size
-total_pages = len(revenue_table) // batch_size if len(revenue_table) % batch_size == 0 else (len(revenue_table) // batch_size) + 1
-current_page = st.session_state.current_page
+with instrument.section("sales.revenue_by_category.frame"):
+    revenue_table = create_revenue_table(sales_cube.rollups(*current_range))
 
-pages = split_frame(revenue_table, batch_size)
-page_data = pages[current_page - 1]
+sales_over_time(df_sales_combined)
+revenue_trends(sales_trends)
+top_products(df_top_products)
+revenue_by_category(revenue_table)
 
-# Modified indexing logic
-page_data.index = range(1, len(page_data) + 1)
-
-with st.container():
-    st.dataframe(page_data, use_container_width=True)
-    st.markdown(f"Page **{current_page}** of **{total_pages}**")
-    pagination_col1, pagination_col2 = st.columns([3, 1])
-    
-    with pagination_col1:
-        st.session_state.page_size = st.selectbox(
-            "Page Size", options=[10, 25, 50, 100], index=[10, 25, 50, 100].index(batch_size)
-        )
-    
-    with pagination_col2:
-        st.session_state.current_page = st.number_input(
-            "Page", min_value=1, max_value=total_pages, step=1, value=current_page
-        )
\ No newline at end of file
+instrument.finish_run()
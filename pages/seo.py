@@ -3,222 +3,244 @@ from nav import make_sidebar
 import pandas as pd
 import streamlit as st
 import altair as alt
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
-from google.analytics.data_v1beta import BetaAnalyticsDataClient
-from google.analytics.data_v1beta.types import (
-    DateRange,
-    Filter,
-    FilterExpression,
-    Dimension,
-    Metric,
-    RunReportRequest,
-)
-
-ga4_credentials = service_account.Credentials.from_service_account_info(
-    st.secrets["ga4_service_account"],
-    scopes=["https://www.googleapis.com/auth/analytics.readonly"]
-)
-client = BetaAnalyticsDataClient(credentials=ga4_credentials)
-
-# Streamlit Setup
+import analytics
+import clients
+import downsample
+import executor
+import freshness
+import instrument
+import page_reports
+import reports
+
+# Streamlit Setup (logged-out visitors are sent back to the login page
+# before anything else runs)
 st.logo("assets/whd_logo.png")
 make_sidebar()
+
+# Time every section of this rerun (see the diagnostics panel)
+instrument.start_run("seo")
+
+client = clients.ga4_client(st.secrets["ga4_service_account"])
+gsc_service = clients.gsc_service(st.secrets["gsc_service_account"])
+
 st.title("📈 SEO Data Dashboard")
 st.divider()
 st.sidebar.header("Select Date Range here👇")
 
-# Google Analytics property ID
-
-property_id = "389980673"
-
 # Date range sidebar
-start_date_current = st.sidebar.date_input("Start date of current month", pd.to_datetime("2024-01-18"))
+start_date_current = st.sidebar.date_input("Start date of current month", pd.to_datetime(page_reports.DEFAULT_START))
 end_date_current = st.sidebar.date_input("End date of current month", pd.to_datetime("today"))
-start_date_compared = st.sidebar.date_input("Start date of month to compare", pd.to_datetime("2024-01-18"))
+start_date_compared = st.sidebar.date_input("Start date of month to compare", pd.to_datetime(page_reports.DEFAULT_START))
 end_date_compared = st.sidebar.date_input("End date of month to compare", pd.to_datetime("today"))
 
-# Function to fetch report data
-def fetch_ga_data(date_range, date_label):
-    request = RunReportRequest(
-        property=f"properties/{property_id}",
-        dimensions=[Dimension(name="sessionDefaultChannelGroup")],
-        metrics=[
-            Metric(name="activeUsers"),
-            Metric(name="newUsers"),
-            Metric(name="engagedSessions"),
-        ],
-        date_ranges=[date_range],
-        dimension_filter=FilterExpression(
-            filter=Filter(
-                field_name="sessionDefaultChannelGroup",
-                string_filter={"value": "Organic Search"},
-            )
-        ),
-    )
-    response = client.run_report(request)
-    data = []
-    for row in response.rows:
-        data.append({
-            'Date Range': date_label,
-            'Channel': row.dimension_values[0].value,
-            'Active Users': row.metric_values[0].value,
-            'New Users': row.metric_values[1].value,
-            'Engaged Sessions': row.metric_values[2].value
-        })
-    return data
-
-# Fetch and combine data
-combined_data = fetch_ga_data(
-    DateRange(start_date=start_date_current.strftime("%Y-%m-%d"), end_date=end_date_current.strftime("%Y-%m-%d")), 
-    start_date_current.strftime('%B %Y')
-)
-combined_data += fetch_ga_data(
-    DateRange(start_date=start_date_compared.strftime("%Y-%m-%d"), end_date=end_date_compared.strftime("%Y-%m-%d")), 
-    start_date_compared.strftime('%B %Y')
-)
-
-# Create DataFrame for combined GA data
-df_combined = pd.DataFrame(combined_data)
-
-def fetch_sessions_data(start_date, end_date):
-    request = RunReportRequest(
-        property=f"properties/{property_id}",
-        dimensions=[Dimension(name="date")],
-        metrics=[Metric(name="sessions")],
-        date_ranges=[DateRange(start_date=start_date, end_date=end_date)]
-    )
-    response = client.run_report(request)
-    
-    sessions_data = [
-        {
-            'Date': pd.to_datetime(row.dimension_values[0].value),
-            'Sessions': int(row.metric_values[0].value)
-        }
-        for row in response.rows
+# The combined frames below are built once from the fetched frames and kept
+# in the shared report cache (reports.derived), so every session and
+# fragment holds the same copy. Don't modify them in place.
+
+# Organic channel data
+def ga_frame(df, date_label):
+    if df is None:
+        return None
+    return pd.DataFrame({
+        'Date Range': pd.Categorical([date_label] * len(df)),
+        'Channel': df['sessionDefaultChannelGroup'],
+        'Active Users': df['activeUsers'],
+        'New Users': df['newUsers'],
+        'Engaged Sessions': df['engagedSessions']
+    }, copy=False)
+
+# Daily sessions data
+def sessions_frame(df):
+    return pd.DataFrame({'Date': df['date'], 'Sessions': df['sessions']}, copy=False)
+
+# Top 10 landing pages data
+def top_landing_pages_frame(df):
+    if df is None:
+        return None
+    return pd.DataFrame({
+        'Landing Page': df['landingPage'],
+        'Active Users': df['activeUsers'],
+        'New Users': df['newUsers'],
+        'Engaged Sessions': df['engagedSessions']
+    }, copy=False)
+
+# Search Console data
+def gsc_frame(df):
+    return pd.DataFrame({
+        'Date': df['date'],
+        'Clicks': df['clicks'],
+        'Impressions': df['impressions'],
+        'CTR': df['ctr'],
+        'Position': df['position']
+    }, copy=False)
+
+current_range = (start_date_current.strftime("%Y-%m-%d"), end_date_current.strftime("%Y-%m-%d"))
+compared_range = (start_date_compared.strftime("%Y-%m-%d"), end_date_compared.strftime("%Y-%m-%d"))
+
+# Fetch every report for the page concurrently, GA4 reports planned into as
+# few API calls as possible. Anything cached but stale is shown as it is
+# and refreshed in the background.
+served = reports.track_freshness()
+results = executor.fetch_all(instrument.timed(page_reports.seo_fetches(client, gsc_service, current_range, compared_range), "seo"))
+ga4_results = results["ga4"]
+freshness.as_of_caption(served)
+
+with instrument.section("seo.frames") as span:
+    ga_frames = lambda: [
+        ga_frame(ga4_results["ga_current"], start_date_current.strftime('%B %Y')),
+        ga_frame(ga4_results["ga_compared"], start_date_compared.strftime('%B %Y')),
     ]
-    return pd.DataFrame(sessions_data)
-
-df_sessions_current = fetch_sessions_data(
-    start_date_current.strftime("%Y-%m-%d"), 
-    end_date_current.strftime("%Y-%m-%d")
-).assign(DateRange="Current Month")
-
-df_sessions_comparison = fetch_sessions_data(
-    start_date_compared.strftime("%Y-%m-%d"),
-    end_date_compared.strftime("%Y-%m-%d")
-).assign(DateRange="Comparison Month")
-
-df_sessions_combined = pd.concat([df_sessions_current, df_sessions_comparison])
-
-sessions_chart = alt.Chart(df_sessions_combined).mark_line().encode(
-    x=alt.X('Date:T', title='Date'),
-    y=alt.Y('Sessions:Q', title='Sessions'),
-    color=alt.Color('DateRange:N', title='Date Range')
-).properties(
-    width=700, height=400
-)
-
-st.subheader("Sessions Over Time")
-st.altair_chart(sessions_chart, use_container_width=True)
-
-
-# Fetch top 10 landing pages data
-request_landing_pages = RunReportRequest(
-    property=f"properties/{property_id}",
-    dimensions=[Dimension(name="landingPage")],
-    metrics=[
-        Metric(name="activeUsers"),
-        Metric(name="newUsers"),
-        Metric(name="engagedSessions"),
-    ],
-    date_ranges=[DateRange(start_date=start_date_current.strftime("%Y-%m-%d"), end_date=end_date_current.strftime("%Y-%m-%d"))],
-)
-response_landing_pages = client.run_report(request_landing_pages)
-top_landing_pages_data = [
-    {
-        'Landing Page': row.dimension_values[0].value,
-        'Active Users': row.metric_values[0].value,
-        'New Users': row.metric_values[1].value,
-        'Engaged Sessions': row.metric_values[2].value
-    }
-    for row in response_landing_pages.rows[:10]
-]
-df_top_landing_pages = pd.DataFrame(top_landing_pages_data)
+    if ga4_results["ga_current"] is not None and ga4_results["ga_compared"] is not None:
+        df_combined = reports.derived(
+            "seo.organic_combined",
+            [page_reports.organic_report(*current_range), page_reports.organic_report(*compared_range)],
+            lambda: pd.concat(ga_frames(), ignore_index=True),
+        )
+    elif ga4_results["ga_current"] is not None or ga4_results["ga_compared"] is not None:
+        # One side deferred for quota: shown as it is, not cached
+        df_combined = pd.concat(ga_frames(), ignore_index=True)
+    else:
+        df_combined = None
+
+    df_sessions_combined = reports.derived(
+        "seo.sessions_combined",
+        [page_reports.daily_sessions_report(*current_range), page_reports.daily_sessions_report(*compared_range)],
+        lambda: pd.concat([
+            sessions_frame(results["sessions_current"]).assign(DateRange="Current Month"),
+            sessions_frame(results["sessions_compared"]).assign(DateRange="Comparison Month"),
+        ]),
+    )
 
-# Display top 10 landing pages
-st.subheader("Top 10 Landing Pages")
-st.dataframe(df_top_landing_pages)
-# Display combined GA data
+    df_top_landing_pages = top_landing_pages_frame(ga4_results["top_landing_pages"])
+
+    df_GSC_combined = reports.derived(
+        "seo.gsc_combined",
+        [page_reports.daily_gsc_query(*current_range), page_reports.daily_gsc_query(*compared_range)],
+        lambda: pd.concat([
+            gsc_frame(results["gsc_current"]).assign(DateRange="Current Month"),
+            gsc_frame(results["gsc_compared"]).assign(DateRange="Comparison Month"),
+        ]),
+    )
+    span.record({"ga": df_combined, "sessions": df_sessions_combined, "gsc": df_GSC_combined})
+
+with instrument.section("seo.trends"):
+    # Sessions, clicks and impressions together, computed once per refresh
+    # of the daily series
+    daily_current = pd.merge(
+        results["sessions_current"], results["gsc_current"][['date', 'clicks', 'impressions']],
+        on='date', how='outer',
+    )
+    seo_trends = analytics.trends(daily_current, ['sessions', 'clicks', 'impressions'])
 
-st.subheader("Month on Month Data")
-st.dataframe(df_combined)
 # Chart creation functions
 
 def create_bar_chart(df, y_metric, title):
-    return alt.Chart(df).mark_bar().encode(
-        x=alt.X('Date Range:N', title='Date Range'),
-        y=alt.Y(f'{y_metric}:Q', title='Count'),
-        color=alt.Color('Channel:N', title='Channel')
-    ).properties(width=150, height=300, title=title)
+    with instrument.section(f"seo.{y_metric} bar.chart"):
+        return alt.Chart(df).mark_bar().encode(
+            x=alt.X('Date Range:N', title='Date Range'),
+            y=alt.Y(f'{y_metric}:Q', title='Count'),
+            color=alt.Color('Channel:N', title='Channel')
+        ).properties(width=150, height=300, title=title)
 def create_line_chart(df, y_metric, title):
-    return alt.Chart(df).mark_line().encode(
-        x='Date:T',
-        y=alt.Y(f'{y_metric}:Q', title=y_metric),
-        color='DateRange:N'
-    ).properties(width=700, height=300, title=title)
-
-# Display charts side by side
-col1, col2 = st.columns(2)
-with col1:
-    st.subheader("Active Users MoM")
-    st.altair_chart(create_bar_chart(df_combined, 'Active Users', "Active Users"), use_container_width=True)
-with col2:
-    st.subheader("New Users MoM")
-    st.altair_chart(create_bar_chart(df_combined, 'New Users', "New Users"), use_container_width=True)
-
-# Fetch GSC Data
-
-gsc_credentials = service_account.Credentials.from_service_account_info(
-    st.secrets["gsc_service_account"]
-)
-gsc_service = build('searchconsole', 'v1', credentials=gsc_credentials)
-
-
-def fetch_gsc_data(start_date, end_date):
-    request = {
-        'startDate': start_date,
-        'endDate': end_date,
-        'dimensions': ['date'],
-        'rowLimit': 1000
-    }
-    response = gsc_service.searchanalytics().query(
-        siteUrl='https://linfieldconstruction.co.uk/', body=request
-    ).execute()
-    
-    return pd.DataFrame([
-        {
-            'Date': row['keys'][0],
-            'Clicks': row['clicks'],
-            'Impressions': row['impressions'],
-            'CTR': row['ctr'],
-            'Position': row['position']
-        } for row in response.get('rows', [])
-    ])
-
-# Fetch and display GSC data
-df_gsc_1 = fetch_gsc_data(start_date_current.strftime("%Y-%m-%d"), end_date_current.strftime("%Y-%m-%d"))
-df_gsc_2 = fetch_gsc_data(start_date_compared.strftime("%Y-%m-%d"), end_date_compared.strftime("%Y-%m-%d"))
-df_GSC_combined = pd.concat([df_gsc_1.assign(DateRange="Current Month"), df_gsc_2.assign(DateRange="Comparison Month")])
-st.markdown("<h2>Google Search Console Data<h2>", unsafe_allow_html=True)
-st.subheader("Month on Month GSC Data")
-st.dataframe(df_GSC_combined)
-
-# Display GSC charts side by side
-col1, col2 = st.columns(2)
-with col1:
-    st.subheader("Clicks Over Time")
-    st.altair_chart(create_line_chart(df_GSC_combined, 'Clicks', "Clicks Over Time"), use_container_width=True)
-with col2:
-    st.subheader("Impressions Over Time")
-    st.altair_chart(create_line_chart(df_GSC_combined, 'Impressions', "Impressions Over Time"), use_container_width=True)
+    with instrument.section(f"seo.{y_metric} line.chart") as span:
+        # Long ranges are thinned to about one point per pixel, keeping peaks
+        chart_data = downsample.for_chart(df, 'Date', y_metric, by='DateRange', max_points=700)
+        span.record(chart_data)
+        return alt.Chart(chart_data).mark_line().encode(
+            x='Date:T',
+            y=alt.Y(f'{y_metric}:Q', title=y_metric),
+            color='DateRange:N'
+        ).properties(width=700, height=300, title=title)
+
+
+def render_chart(name, chart):
+    with instrument.section(f"seo.{name}.render"):
+        st.altair_chart(chart, use_container_width=True)
+
+
+# Each section below is a fragment, so controls added to a section rerun
+# only that section against the frames from the last full run.
+
+@st.fragment
+def sessions_over_time(df_sessions_combined):
+    with instrument.section("seo.sessions_over_time.chart") as span:
+        # Long ranges are thinned to about one point per pixel, keeping peaks
+        chart_data = downsample.for_chart(df_sessions_combined, 'Date', 'Sessions', by='DateRange', max_points=700)
+        sessions_chart = alt.Chart(chart_data).mark_line().encode(
+            x=alt.X('Date:T', title='Date'),
+            y=alt.Y('Sessions:Q', title='Sessions'),
+            color=alt.Color('DateRange:N', title='Date Range')
+        ).properties(
+            width=700, height=400
+        )
+        span.record(chart_data)
+
+    st.subheader("Sessions Over Time")
+    render_chart("sessions_over_time", sessions_chart)
+
+
+# Rolling averages and period-over-period changes as of the end of the
+# current range
+@st.fragment
+def trends(seo_trends):
+    st.subheader("Trends")
+    with instrument.section("seo.trends.render"):
+        st.dataframe(seo_trends.latest().rename(index=str.capitalize, columns=analytics.LABELS))
+
+
+# Display top 10 landing pages
+@st.fragment
+def top_landing_pages(df_top_landing_pages):
+    st.subheader("Top 10 Landing Pages")
+    if df_top_landing_pages is None:
+        st.info("Top landing pages are paused while the GA4 quota is running low.")
+    else:
+        with instrument.section("seo.top_landing_pages.render"):
+            st.dataframe(df_top_landing_pages)
+
+
+# Display combined GA data
+@st.fragment
+def month_on_month(df_combined):
+    st.subheader("Month on Month Data")
+    if df_combined is None:
+        st.info("Month on month data is paused while the GA4 quota is running low.")
+        return
+    with instrument.section("seo.month_on_month.render"):
+        st.dataframe(df_combined)
+
+    # Display charts side by side
+    col1, col2 = st.columns(2)
+    with col1:
+        st.subheader("Active Users MoM")
+        render_chart("Active Users bar", create_bar_chart(df_combined, 'Active Users', "Active Users"))
+    with col2:
+        st.subheader("New Users MoM")
+        render_chart("New Users bar", create_bar_chart(df_combined, 'New Users', "New Users"))
+
+
+# Display GSC data
+@st.fragment
+def search_console(df_GSC_combined):
+    st.markdown("<h2>Google Search Console Data<h2>", unsafe_allow_html=True)
+    st.subheader("Month on Month GSC Data")
+    with instrument.section("seo.search_console.render"):
+        st.dataframe(df_GSC_combined)
+
+    # Display GSC charts side by side
+    col1, col2 = st.columns(2)
+    with col1:
+        st.subheader("Clicks Over Time")
+        render_chart("Clicks line", create_line_chart(df_GSC_combined, 'Clicks', "Clicks Over Time"))
+    with col2:
+        st.subheader("Impressions Over Time")
+        render_chart("Impressions line", create_line_chart(df_GSC_combined, 'Impressions', "Impressions Over Time"))
+
+
+sessions_over_time(df_sessions_combined)
+trends(seo_trends)
+top_landing_pages(df_top_landing_pages)
+month_on_month(df_combined)
+search_console(df_GSC_combined)
+
+instrument.finish_run()
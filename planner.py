@@ -0,0 +1,144 @@
+from dataclasses import dataclass, field, replace
+
+from google.analytics.data_v1beta.types import BatchRunReportsRequest, DateRange
+
+import decode
+import reports
+import streaming
+from rate_limit import QuotaDeferred, limiter
+from singleflight import flights
+
+# Query planner for GA4. A page hands over its logical reports by name; the
+# planner drops the ones already cached, folds reports that only differ by
+# date range into one request with several date_ranges, groups what's left
+# into batchRunReports calls and splits the responses back into one frame
+# per logical report (each cached under its own key).
+
+# GA4 API limits
+MAX_DATE_RANGES = 4
+MAX_BATCH_SIZE = 5
+
+
+@dataclass
+class PlannedRequest:
+    request: object
+    # (date range name or None, logical report) served by this request
+    members: list = field(default_factory=list)
+
+
+def _shape(report):
+    # Everything but the date range. A row limit applies across all of a
+    # request's date ranges, so ranked reports are never folded together.
+    if report.limit:
+        return report.key()
+    return replace(report, start_date="", end_date="").key()
+
+
+def _merged_request(members):
+    request = members[0].request()
+    if not request.limit:
+        # GA4 otherwise stops at 10k rows
+        request.limit = streaming.GA4_PAGE_SIZE
+    if len(members) == 1:
+        return PlannedRequest(request, [(None, members[0])])
+    names = [f"range_{i}" for i in range(len(members))]
+    request.date_ranges = [
+        DateRange(start_date=report.start_date, end_date=report.end_date, name=name)
+        for name, report in zip(names, members)
+    ]
+    # With more than one date range GA4 adds a dateRange dimension itself,
+    # holding each row's range name
+    return PlannedRequest(request, list(zip(names, members)))
+
+
+def plan(logical_reports):
+    # Returns [(property_id, [PlannedRequest, ...]), ...], one entry per API call
+    shapes = {}
+    for report in {report.key(): report for report in logical_reports}.values():
+        shapes.setdefault(_shape(report), []).append(report)
+
+    by_property = {}
+    for members in shapes.values():
+        for i in range(0, len(members), MAX_DATE_RANGES):
+            planned = _merged_request(members[i:i + MAX_DATE_RANGES])
+            by_property.setdefault(members[0].property_id, []).append(planned)
+
+    calls = []
+    for property_id, planned in by_property.items():
+        for i in range(0, len(planned), MAX_BATCH_SIZE):
+            calls.append((property_id, planned[i:i + MAX_BATCH_SIZE]))
+    return calls
+
+
+def _split(client, planned, response):
+    if len(response.rows) < response.row_count and not planned.members[0][1].limit:
+        # Truncated at the API's default row limit: page through each report
+        for _, report in planned.members:
+            yield report, streaming.read_all(streaming.iter_ga4_pages(client, report))
+        return
+    df = decode.ga4_frame(response)
+    for name, report in planned.members:
+        if name is None:
+            part = df
+        else:
+            part = df[df["dateRange"] == name].drop(columns="dateRange").reset_index(drop=True)
+        yield report, part
+
+
+def run_call(client, property_id, planned):
+    # A call is as important as the most important report it carries
+    priority = min(report.priority for p in planned for _, report in p.members)
+    if len(planned) == 1:
+        responses = [limiter.call("ga4", property_id, lambda: client.run_report(planned[0].request), priority)]
+    else:
+        responses = limiter.call("ga4", property_id, lambda: client.batch_run_reports(BatchRunReportsRequest(
+            property=f"properties/{property_id}",
+            requests=[p.request for p in planned],
+        )), priority).reports
+    frames = {}
+    for p, response in zip(planned, responses):
+        limiter.record_quota(property_id, response.property_quota)
+        for report, df in _split(client, p, response):
+            frames[report.key()] = reports.remember(report, df)
+    return frames
+
+
+def _call_key(planned):
+    # Single-flight key of a call. Namespaced so a call carrying a single
+    # report doesn't share a flight with reports.fetch_once's for that
+    # report, which returns a frame rather than {key: frame}.
+    return "plan:" + "|".join(report.key() for p in planned for _, report in p.members)
+
+
+def _refresh(client, report):
+    # Background revalidation of one stale report, outside any batch
+    for property_id, planned in plan([report]):
+        flights.do(_call_key(planned), lambda: run_call(client, property_id, planned))
+
+
+def run_reports(client, named_reports):
+    # named_reports: {name: GA4Report}. Returns {name: DataFrame}, with None
+    # for reports deferred because their property's quota is running low
+    # or has run out.
+    # Stale cached reports are returned as they are and refreshed in the
+    # background.
+    frames = {}
+    misses = []
+    for report in named_reports.values():
+        df = reports.cached(report, refresh=lambda report=report: _refresh(client, report))
+        if df is not None:
+            frames[report.key()] = df
+        elif limiter.admit(report.property_id, report.priority):
+            misses.append(report)
+        else:
+            frames[report.key()] = None
+    for property_id, planned in plan(misses):
+        # Sessions planning the same reports produce the same call; only
+        # one of them sends it.
+        try:
+            frames.update(flights.do(_call_key(planned), lambda: run_call(client, property_id, planned)))
+        except QuotaDeferred:
+            # Out of quota: these reports come back as None, like shed ones
+            reports.note_deferred()
+            frames.update((report.key(), None) for p in planned for _, report in p.members)
+    return {name: frames[report.key()] for name, report in named_reports.items()}
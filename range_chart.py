@@ -0,0 +1,129 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+from streamlit_echarts import st_echarts
+
+import downsample
+
+# ECharts line chart over a long time series, driven by its range slider.
+# The series is kept server side, sorted, so a date window is two binary
+# searches away; the chart is only ever sent the points inside the window,
+# thinned to about one per pixel. The x axis always spans the whole series,
+# so slider positions map to dates, and the option spec is the same on
+# every rerun apart from the dataset and slider positions. When neither
+# changes the component gets identical args and the front end doesn't redraw.
+#
+# Dragging the slider sends its position back as the component's value,
+# which reruns just this fragment to slice the next window.
+
+DEFAULT_MAX_POINTS = downsample.DEFAULT_MAX_POINTS
+# Minimum ms between zoom events while the slider is dragged
+THROTTLE_MS = 150
+
+# Runs in the browser on every dataZoom; what it returns becomes the
+# component's value. Slider and mouse-wheel zooms both report percentages
+# of the x axis.
+ON_ZOOM = """function(params) {
+    var zoom = params.batch ? params.batch[0] : params;
+    return [zoom.start, zoom.end];
+}"""
+
+
+class RangeSeries:
+
+    def __init__(self, df, x, columns):
+        df = df.dropna(subset=[x]).sort_values(x)
+        self.x = df[x].to_numpy(dtype="datetime64[ns]")
+        self.columns = {name: df[name].to_numpy(dtype=float) for name in columns}
+
+    def __len__(self):
+        return len(self.x)
+
+    def bounds(self):
+        return self.x[0], self.x[-1]
+
+    def window(self, start, end, max_points=DEFAULT_MAX_POINTS):
+        # (x, {column: y}) for start <= x <= end, at most about max_points
+        lo = np.searchsorted(self.x, start, side="left")
+        hi = np.searchsorted(self.x, end, side="right")
+        x = self.x[lo:hi]
+        columns = {name: y[lo:hi] for name, y in self.columns.items()}
+        if len(x) <= max_points:
+            return x, columns
+        # Every line keeps its own peaks and dips; the lines share x values
+        x_series = pd.Series(x)
+        budget = max(max_points // len(columns), 2)
+        keep = []
+        for y in columns.values():
+            valid = np.flatnonzero(~np.isnan(y))
+            keep.append(valid[downsample.positions(x_series.iloc[valid].reset_index(drop=True), pd.Series(y[valid]), budget)])
+        keep = np.unique(np.concatenate(keep))
+        return x[keep], {name: y[keep] for name, y in columns.items()}
+
+
+def _ms(x):
+    return x.astype("datetime64[ms]").astype(np.int64)
+
+
+def _option(series, x, columns, start, end, title):
+    x0, x1 = _ms(np.array(series.bounds()))
+    span = max(int(x1 - x0), 1)
+    percent = lambda t: round(float(_ms(np.datetime64(t, "ns")) - x0) * 100 / span, 3)
+    # NaN as null, which ECharts draws as a gap
+    values = [np.where(np.isnan(y), None, y).tolist() for y in columns.values()]
+    zoom = {"start": percent(start), "end": percent(end), "throttle": THROTTLE_MS}
+    return {
+        "title": {"text": title},
+        "tooltip": {"trigger": "axis"},
+        "legend": {"top": 0, "right": 0},
+        "dataset": {"source": [["date", *columns], *zip(_ms(x).tolist(), *values)]},
+        "xAxis": {"type": "time", "min": int(x0), "max": int(x1)},
+        "yAxis": {"type": "value"},
+        "dataZoom": [{"type": "slider", **zoom}, {"type": "inside", **zoom}],
+        "series": [
+            {"type": "line", "name": name, "showSymbol": False, "encode": {"x": 0, "y": i + 1}}
+            for i, name in enumerate(columns)
+        ],
+    }
+
+
+@st.fragment
+def range_chart(df, x, columns, key, window=None, title="", height="400px", max_points=DEFAULT_MAX_POINTS):
+    # df: one row per x (a datetime column) with a column per line. window:
+    # the (start, end) to open on; whenever it changes the chart jumps
+    # back to it. Returns the (start, end) on show.
+    view = st.session_state.setdefault(f"{key}_view", {})
+    # Re-index only when the data changes (the window stays where it was).
+    # The frame itself is kept in the view so its id can't be reused.
+    signature = (id(df), x, tuple(columns))
+    if view.get("signature") != signature:
+        view["data"] = df
+        view["signature"] = signature
+        view["series"] = RangeSeries(df, x, columns)
+    series = view["series"]
+    if not len(series):
+        st.info("No data to chart.")
+        return None
+
+    first, last = series.bounds()
+    if window is not None:
+        window = tuple(np.datetime64(pd.Timestamp(t), "ns") for t in window)
+    if "window" not in view or window != view.get("requested"):
+        view["requested"] = window
+        view["window"] = window or (first, last)
+
+    zoom = st.session_state.get(f"{key}_echarts")
+    if zoom and zoom != view.get("zoom"):
+        # A new slider position from the browser
+        view["zoom"] = zoom
+        view["window"] = tuple(first + (last - first) * (p / 100) for p in zoom)
+
+    start, end = (min(max(t, first), last) for t in view["window"])
+    chart_x, chart_columns = series.window(start, end, max_points)
+    st_echarts(
+        options=_option(series, chart_x, chart_columns, start, end, title),
+        events={"datazoom": ON_ZOOM},
+        height=height,
+        key=f"{key}_echarts",
+    )
+    return start, end
@@ -0,0 +1,167 @@
+import random
+import threading
+import time
+
+from google.api_core import exceptions as api_exceptions
+from googleapiclient.errors import HttpError
+
+import instrument
+
+# Quota-aware throttling for GA4 and Search Console calls. Every upstream
+# call waits on a token bucket for its property/site and is retried with
+# jittered exponential backoff on rate limits and transient errors. GA4
+# requests ask for their property quota back, and when a property's
+# remaining tokens run low, lower-priority sections are deferred so the KPIs
+# still load. A property that has run out of tokens isn't retried (they
+# come back by the hour, not in seconds): the call raises QuotaDeferred, as
+# does any call still rate limited after its retries, and callers fall back
+# to stored or stale data.
+
+CRITICAL = 0
+NORMAL = 1
+LOW = 2
+
+# Shed a priority once the remaining GA4 token share drops below this
+SHED_BELOW = {CRITICAL: 0.0, NORMAL: 0.10, LOW: 0.25}
+
+# Requests per second (and burst) per GA4 property / GSC site
+GA4_RATE = 10
+GSC_RATE = 5
+
+MAX_RETRIES = 5
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 30
+
+RETRYABLE = (
+    api_exceptions.ResourceExhausted,
+    api_exceptions.TooManyRequests,
+    api_exceptions.ServiceUnavailable,
+    api_exceptions.InternalServerError,
+    api_exceptions.DeadlineExceeded,
+)
+RETRYABLE_HTTP_STATUSES = {429, 500, 503}
+
+
+class QuotaDeferred(Exception):
+    # Raised instead of calling upstream when the quota budget is too low
+    # for the request's priority, and when upstream says it's out of quota.
+    pass
+
+
+class TokenBucket:
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        # Returns True if the caller had to wait for a token
+        waited = False
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                wait = (1 - self._tokens) / self.rate
+            waited = True
+            time.sleep(wait)
+
+
+class RateLimiter:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._quota = {}
+        self.retries = 0
+        self.throttled = 0
+        self.deferred = 0
+
+    def _bucket(self, source, scope):
+        with self._lock:
+            bucket = self._buckets.get((source, scope))
+            if bucket is None:
+                rate = GA4_RATE if source == "ga4" else GSC_RATE
+                bucket = self._buckets[(source, scope)] = TokenBucket(rate)
+            return bucket
+
+    def record_quota(self, property_id, property_quota):
+        # Keep the tightest of the hourly and daily token budgets
+        if not property_quota:
+            return
+        shares = []
+        for status in (property_quota.tokens_per_hour, property_quota.tokens_per_day):
+            total = status.consumed + status.remaining
+            if total:
+                shares.append(status.remaining / total)
+        if shares:
+            with self._lock:
+                self._quota[property_id] = min(shares)
+
+    def remaining(self, property_id):
+        with self._lock:
+            return self._quota.get(property_id, 1.0)
+
+    def admit(self, property_id, priority=NORMAL):
+        # False (and counted as deferred) if the request should be shed
+        if self.remaining(property_id) >= SHED_BELOW[priority]:
+            return True
+        with self._lock:
+            self.deferred += 1
+        return False
+
+    def call(self, source, scope, fn, priority=NORMAL):
+        if source == "ga4" and not self.admit(scope, priority):
+            raise QuotaDeferred(f"GA4 quota for property {scope} is too low for this request")
+        bucket = self._bucket(source, scope)
+        for attempt in range(MAX_RETRIES + 1):
+            if bucket.acquire():
+                with self._lock:
+                    self.throttled += 1
+            instrument.count("upstream_calls")
+            try:
+                return fn()
+            except Exception as e:
+                if source == "ga4" and isinstance(e, api_exceptions.ResourceExhausted):
+                    # Out of tokens: shed everything but critical until a
+                    # response tells us the budget has recovered
+                    with self._lock:
+                        self._quota[scope] = 0.0
+                    raise QuotaDeferred(f"GA4 quota for property {scope} is exhausted") from e
+                if attempt == MAX_RETRIES or not _retryable(e):
+                    if _quota_error(e):
+                        raise QuotaDeferred(f"{source} is still rate limiting {scope}") from e
+                    raise
+                with self._lock:
+                    self.retries += 1
+                time.sleep(random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt)))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "quota_remaining": dict(self._quota),
+                "throttled": self.throttled,
+                "retries": self.retries,
+                "deferred": self.deferred,
+            }
+
+
+def _quota_error(error):
+    if isinstance(error, (api_exceptions.ResourceExhausted, api_exceptions.TooManyRequests)):
+        return True
+    return isinstance(error, HttpError) and error.resp.status == 429
+
+
+def _retryable(error):
+    if isinstance(error, RETRYABLE):
+        return True
+    return isinstance(error, HttpError) and error.resp.status in RETRYABLE_HTTP_STATUSES
+
+
+limiter = RateLimiter()
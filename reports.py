@@ -0,0 +1,420 @@
+import datetime
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field, replace
+
+import pandas as pd
+from google.analytics.data_v1beta.types import (
+    DateRange,
+    Dimension,
+    Filter,
+    FilterExpression,
+    FilterExpressionList,
+    Metric,
+    OrderBy,
+    RunReportRequest,
+)
+
+import instrument
+import memory
+import streaming
+from rate_limit import CRITICAL, LOW, NORMAL
+from singleflight import flights
+
+# Shared GA4 / Search Console report layer used by every dashboard page.
+# Responses are decoded once into DataFrames and kept in a process-wide cache,
+# so widget reruns and other sessions asking for the same report don't go back
+# to Google. Cached frames are shared: treat them as read-only.
+#
+# Entries outlive their TTL by a report's max staleness. Within that window
+# they are served straight away (stale-while-revalidate) while a background
+# worker refetches them, so the first visitor after an expiry isn't left
+# waiting on Google.
+
+# TTLs in seconds, picked from how "closed" the requested range is
+TODAY_TTL = 5 * 60             # range includes today, numbers still moving
+SETTLING_TTL = 60 * 60         # range ends in the last few days, GA4 still backfilling
+HISTORICAL_TTL = 24 * 60 * 60  # fully closed range, won't change
+SETTLING_DAYS = 3
+
+# How long past its TTL a report may still be shown while it refreshes,
+# by report priority: KPIs go stale quickest, rankings can lag the most.
+# A report's own max_stale overrides this; 0 turns revalidation off.
+MAX_STALE = {
+    CRITICAL: 15 * 60,
+    NORMAL: 60 * 60,
+    LOW: 6 * 60 * 60,
+}
+
+CACHE_MAXSIZE = 256
+# Byte budget for all cached frames; least recently used go first
+CACHE_MAX_BYTES = int(os.environ.get("DASHBOARD_CACHE_MAX_BYTES", 512 * 2**20))
+
+# Fields that tune caching/scheduling but don't change the data asked for
+_NOT_KEYED = ("ttl", "priority", "max_stale")
+
+
+def ttl_for(end_date):
+    end = pd.to_datetime(end_date).date()
+    today = datetime.date.today()
+    if end >= today:
+        return TODAY_TTL
+    if (today - end).days <= SETTLING_DAYS:
+        return SETTLING_TTL
+    return HISTORICAL_TTL
+
+
+def _key_params(spec):
+    return {name: value for name, value in asdict(spec).items() if name not in _NOT_KEYED}
+
+
+def _canonical_key(source, params):
+    payload = json.dumps({"source": source, **params}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+@dataclass(frozen=True)
+class GA4Report:
+    property_id: str
+    dimensions: tuple
+    metrics: tuple
+    start_date: str
+    end_date: str
+    # ((field_name, exact string value), ...) ANDed together
+    filters: tuple = ()
+    # Server-side ranking: sort by this metric, descending, and keep `limit` rows
+    order_by: str = None
+    limit: int = None
+    offset: int = None
+    ttl: float = field(default=None, compare=False)
+    # rate_limit.CRITICAL / NORMAL / LOW: what gets shed first when quota runs low
+    priority: int = field(default=NORMAL, compare=False)
+    # Seconds past the TTL this may be served stale; None uses MAX_STALE
+    max_stale: float = field(default=None, compare=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, "property_id", str(self.property_id))
+        object.__setattr__(self, "dimensions", tuple(self.dimensions))
+        object.__setattr__(self, "metrics", tuple(self.metrics))
+        object.__setattr__(self, "filters", tuple(sorted(tuple(f) for f in self.filters)))
+
+    def key(self):
+        return _canonical_key("ga4", _key_params(self))
+
+    def request(self):
+        return RunReportRequest(
+            property=f"properties/{self.property_id}",
+            dimensions=[Dimension(name=name) for name in self.dimensions],
+            metrics=[Metric(name=name) for name in self.metrics],
+            date_ranges=[DateRange(start_date=self.start_date, end_date=self.end_date)],
+            dimension_filter=_filter_expression(self.filters),
+            order_bys=[OrderBy(metric=OrderBy.MetricOrderBy(metric_name=self.order_by), desc=True)] if self.order_by else [],
+            limit=self.limit or 0,
+            offset=self.offset or 0,
+            return_property_quota=True,
+        )
+
+
+@dataclass(frozen=True)
+class GSCQuery:
+    site_url: str
+    start_date: str
+    end_date: str
+    dimensions: tuple = ("date",)
+    # None means every row, fetched in pages
+    row_limit: int = None
+    start_row: int = None
+    ttl: float = field(default=None, compare=False)
+    priority: int = field(default=NORMAL, compare=False)
+    max_stale: float = field(default=None, compare=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, "dimensions", tuple(self.dimensions))
+
+    def key(self):
+        return _canonical_key("gsc", _key_params(self))
+
+    def body(self):
+        body = {
+            'startDate': self.start_date,
+            'endDate': self.end_date,
+            'dimensions': list(self.dimensions),
+        }
+        if self.row_limit:
+            body['rowLimit'] = self.row_limit
+        if self.start_row:
+            body['startRow'] = self.start_row
+        return body
+
+
+def ranked(report, metric, n):
+    # Top-n rows by `metric`, ranked by the API rather than after download.
+    # Search Console always ranks by clicks, so only the row limit applies there.
+    if isinstance(report, GSCQuery):
+        if metric != "clicks":
+            raise ValueError("Search Console results can only be ranked by clicks")
+        return replace(report, row_limit=n)
+    if metric not in report.metrics:
+        raise ValueError(f"{metric} is not one of the report's metrics")
+    return replace(report, order_by=metric, limit=n)
+
+
+def _filter_expression(filters):
+    if not filters:
+        return None
+    expressions = [
+        FilterExpression(filter=Filter(field_name=name, string_filter={"value": value}))
+        for name, value in filters
+    ]
+    if len(expressions) == 1:
+        return expressions[0]
+    return FilterExpression(and_group=FilterExpressionList(expressions=expressions))
+
+
+@dataclass
+class _Entry:
+    value: object
+    expires_at: float
+    stale_until: float
+    stored_at: float
+    size: int
+
+
+class ReportCache:
+    # LRU with a TTL per entry, plus a grace period during which an expired
+    # entry can still be served stale. Bounded by entry count and by the
+    # total size of the cached frames. Shared by all sessions, hence the lock.
+
+    def __init__(self, maxsize=CACHE_MAXSIZE, max_bytes=CACHE_MAX_BYTES):
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def lookup(self, key, allow_stale=False):
+        # (value, stored_at, fresh) or None. stored_at is wall-clock time.
+        with self._lock:
+            entry = self._entries.get(key)
+            now = time.monotonic()
+            if entry is not None and entry.stale_until <= now:
+                self._pop(key)
+                entry = None
+            fresh = entry is not None and entry.expires_at > now
+            if not fresh and not (entry is not None and allow_stale):
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            if fresh:
+                self.hits += 1
+            else:
+                self.stale_hits += 1
+            return entry.value, entry.stored_at, fresh
+
+    def get(self, key):
+        entry = self.lookup(key)
+        return None if entry is None else entry[0]
+
+    def stored_at(self, key, value):
+        # When `value` was stored under key, or None if it isn't (any more)
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry.stored_at if entry is not None and entry.value is value else None
+
+    def put(self, key, value, ttl, max_stale=0):
+        size = memory.nbytes(value)
+        with self._lock:
+            expires_at = time.monotonic() + ttl
+            if key in self._entries:
+                self._pop(key)
+            self._entries[key] = _Entry(value, expires_at, expires_at + max_stale, time.time(), size)
+            self.bytes += size
+            # The newest entry stays even if it alone is over the budget
+            while len(self._entries) > 1 and (len(self._entries) > self.maxsize or self.bytes > self.max_bytes):
+                self._pop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _pop(self, key):
+        self.bytes -= self._entries.pop(key).size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "maxsize": self.maxsize,
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+report_cache = ReportCache()
+
+# Background refetches of stale entries, one per report key at a time
+revalidate_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="revalidate")
+_revalidating = {}
+_revalidating_lock = threading.Lock()
+
+
+class Freshness:
+    # What a page render was served from the cache: the age of its oldest
+    # data and the background refreshes started for anything stale. Set up
+    # per render with track_freshness(); executor.fetch_all carries it into
+    # the fetch threads.
+
+    def __init__(self):
+        self.as_of = None
+        self.pending = []
+        # Some fetch was deferred for quota: what's shown may be incomplete
+        self.deferred = False
+        self._lock = threading.Lock()
+
+    def note(self, stored_at, refresh=None):
+        with self._lock:
+            self.as_of = stored_at if self.as_of is None else min(self.as_of, stored_at)
+            if refresh is not None:
+                self.pending.append(refresh)
+
+    def refreshing(self):
+        return any(not future.done() for future in self.pending)
+
+    def refreshed(self):
+        # Every refresh has finished and at least one brought new data
+        return (
+            bool(self.pending)
+            and not self.refreshing()
+            and any(future.exception() is None for future in self.pending)
+        )
+
+
+_freshness = ContextVar("freshness", default=None)
+
+
+def track_freshness():
+    freshness = Freshness()
+    _freshness.set(freshness)
+    return freshness
+
+
+def note_deferred():
+    # Called when a fetch for this render gave way to quota limits and the
+    # page is showing what was stored instead
+    freshness = _freshness.get()
+    if freshness is not None:
+        freshness.deferred = True
+
+
+def max_stale_for(report):
+    return MAX_STALE[report.priority] if report.max_stale is None else report.max_stale
+
+
+def revalidate(report, refresh):
+    # Runs `refresh` (which fetches and remembers the report) in the
+    # background unless a refresh for the same report is already running.
+    key = report.key()
+    with _revalidating_lock:
+        future = _revalidating.get(key)
+        if future is not None:
+            return future
+        future = _revalidating[key] = revalidate_pool.submit(refresh)
+    future.add_done_callback(lambda f: _revalidated(key, f))
+    return future
+
+
+def _revalidated(key, future):
+    with _revalidating_lock:
+        if _revalidating.get(key) is future:
+            del _revalidating[key]
+
+
+def cached(report, refresh=None):
+    # The cached frame if it's fresh. With `refresh` given, a frame past its
+    # TTL but within max_stale_for(report) is returned too, and `refresh`
+    # is scheduled to replace it.
+    entry = report_cache.lookup(report.key(), allow_stale=refresh is not None)
+    if entry is None:
+        instrument.count("cache_misses")
+        return None
+    df, stored_at, fresh = entry
+    instrument.count("cache_hits" if fresh else "stale_hits")
+    future = None if fresh else revalidate(report, refresh)
+    freshness = _freshness.get()
+    if freshness is not None:
+        freshness.note(stored_at, future)
+    return df
+
+
+def remember(report, df):
+    report_cache.put(report.key(), df, report.ttl or ttl_for(report.end_date), max_stale_for(report))
+    return df
+
+
+def derived(name, inputs, build):
+    # A frame built from other reports' frames (relabelled, concatenated...)
+    # kept in the cache next to them, so every session shares one copy
+    # rather than building its own. inputs: the reports it's built from;
+    # it's rebuilt when the soonest of them would expire.
+    key = _canonical_key(name, {"inputs": [report.key() for report in inputs]})
+    df = report_cache.get(key)
+    if df is None:
+        df = build()
+        freshness = _freshness.get()
+        # Built from whatever was stored while quota was out: not kept
+        if freshness is None or not freshness.deferred:
+            report_cache.put(key, df, min(report.ttl or ttl_for(report.end_date) for report in inputs))
+    return df
+
+
+def fetch_once(report, fetch):
+    # Cache miss path shared by every fetcher: identical requests already in
+    # flight elsewhere are waited on rather than repeated. The cache is
+    # checked again in case a flight finished between our miss and now.
+    def lead():
+        df = report_cache.get(report.key())
+        return df if df is not None else remember(report, fetch())
+    return flights.do(report.key(), lead)
+
+
+def fetched_at(report, df):
+    # Wall-clock time `df`, as just returned for `report`, came from
+    # upstream: a cached or stale frame can be from well before now (even
+    # yesterday). If it has been replaced or evicted since, it's taken to be
+    # old, so nothing is treated as final on its account.
+    stored_at = report_cache.stored_at(report.key(), df)
+    return 0.0 if stored_at is None else stored_at
+
+
+def run_report(client, report):
+    # Pages past the first are only requested when GA4 says there are more
+    # rows, so small reports still cost a single call.
+    fetch = lambda: streaming.read_all(streaming.iter_ga4_pages(client, report))
+    df = cached(report, refresh=lambda: fetch_once(report, fetch))
+    if df is None:
+        df = fetch_once(report, fetch)
+    return df
+
+
+def run_gsc_query(service, query):
+    fetch = lambda: streaming.read_all(streaming.iter_gsc_pages(service, query))
+    df = cached(query, refresh=lambda: fetch_once(query, fetch))
+    if df is None:
+        df = fetch_once(query, fetch)
+    return df
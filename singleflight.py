@@ -0,0 +1,61 @@
+import threading
+
+# Process-wide request coalescing. When several sessions ask for the same
+# report at once (e.g. everyone opening Sales with the default range on the
+# first of the month), the first caller fetches it and the rest wait for
+# that result instead of sending identical requests upstream.
+
+
+class _Call:
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlight:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.upstream = 0
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.upstream += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = fn()
+            return call.value
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "in_flight": len(self._calls),
+                "upstream": self.upstream,
+                "coalesced": self.coalesced,
+            }
+
+
+flights = SingleFlight()
@@ -0,0 +1,111 @@
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+
+import decode
+import executor
+from clients import registry
+from rate_limit import limiter
+
+# Paginated GA4 / Search Console fetches as generators of column batches.
+# The first page is fetched in the calling thread; only when the response
+# says there are more rows is the next page requested in the background,
+# while the caller decodes and consumes the current one. Only one or two
+# pages are ever held at a time, so multi-hundred-thousand-row exports stay
+# bounded in memory. Prefetches run in the caller's context, so
+# instrumentation charges them to the right section.
+
+# API maximums are 250k rows (GA4) and 25k rows (GSC) per call
+GA4_PAGE_SIZE = 100_000
+GSC_PAGE_SIZE = 25_000
+
+# Each fetch running on the executor's pool has at most one prefetch in
+# flight, so the same number of workers means a prefetch never queues
+PREFETCH_WORKERS = executor.POOL_WORKERS
+
+prefetch_pool = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="page-prefetch")
+
+_busy = 0
+_peak_busy = 0
+_busy_lock = threading.Lock()
+
+
+def _counted(fn, *args):
+    global _busy, _peak_busy
+    with _busy_lock:
+        _busy += 1
+        _peak_busy = max(_peak_busy, _busy)
+    try:
+        return fn(*args)
+    finally:
+        with _busy_lock:
+            _busy -= 1
+
+
+def _prefetch(fetch, *args):
+    return prefetch_pool.submit(_counted, contextvars.copy_context().run, fetch, *args)
+
+
+def stats():
+    with _busy_lock:
+        return {
+            "workers": PREFETCH_WORKERS,
+            "busy": _busy,
+            "peak_busy": _peak_busy,
+            "queued": prefetch_pool._work_queue.qsize(),
+        }
+
+
+def iter_ga4_pages(client, report, page_size=GA4_PAGE_SIZE):
+    # Honours report.offset/report.limit as the overall window to stream.
+    start = report.offset or 0
+    end = start + report.limit if report.limit else None
+
+    def fetch(offset):
+        limit = page_size if end is None else min(page_size, end - offset)
+        request = replace(report, offset=offset, limit=limit).request()
+        response = limiter.call("ga4", report.property_id, lambda: client.run_report(request), report.priority)
+        limiter.record_quota(report.property_id, response.property_quota)
+        return response
+
+    offset = start
+    response = fetch(offset)
+    while True:
+        offset += len(response.rows)
+        more = len(response.rows) > 0 and offset < response.row_count and (end is None or offset < end)
+        future = _prefetch(fetch, offset) if more else None
+        yield decode.ga4_frame(response)
+        if future is None:
+            return
+        response = future.result()
+
+
+def iter_gsc_pages(service, query, page_size=GSC_PAGE_SIZE):
+    start = query.start_row or 0
+    end = start + query.row_limit if query.row_limit else None
+
+    def fetch(start_row):
+        limit = page_size if end is None else min(page_size, end - start_row)
+        body = replace(query, start_row=start_row, row_limit=limit).body()
+        response = limiter.call("gsc", query.site_url, lambda: service.searchanalytics().query(
+            siteUrl=query.site_url, body=body
+        ).execute(http=registry.gsc_http(service)), query.priority)
+        return response, limit
+
+    start_row = start
+    response, limit = fetch(start_row)
+    while True:
+        rows = response.get('rows', [])
+        start_row += len(rows)
+        more = len(rows) == limit and (end is None or start_row < end)
+        future = _prefetch(fetch, start_row) if more else None
+        yield decode.gsc_frame(rows, query.dimensions)
+        if future is None:
+            return
+        response, limit = future.result()
+
+
+def read_all(pages):
+    return decode.concat(pages)
+
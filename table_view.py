@@ -0,0 +1,72 @@
+import numpy as np
+import streamlit as st
+
+# Paginated table backed by the caller's frame plus an index of row
+# positions in display order. Sorting and filtering happen here on the
+# server; a page flip only slices the rows it shows, with no hashing and no
+# per-page copies, so memory stays O(data) whatever page sizes get picked.
+
+PAGE_SIZES = [10, 25, 50, 100]
+
+
+def _positions(df, sort_by, ascending, filter_column, filter_text):
+    positions = np.arange(len(df))
+    if filter_text:
+        matches = df[filter_column].astype(str).str.contains(filter_text, case=False, regex=False)
+        positions = positions[matches.to_numpy()]
+    if sort_by:
+        # Ties keep their order and missing values go last either way
+        values = df[sort_by].iloc[positions].reset_index(drop=True)
+        order = values.sort_values(ascending=ascending, kind="stable", na_position="last").index.to_numpy()
+        positions = positions[order]
+    return positions
+
+
+def paginated_table(df, key, sort_by=None, ascending=False):
+    columns = list(df.columns)
+    view = st.session_state.setdefault(f"{key}_view", {})
+
+    sort_col, direction_col, filter_col, text_col = st.columns([2, 1, 2, 2])
+    with sort_col:
+        sort_by = st.selectbox(
+            "Sort by", options=columns, key=f"{key}_sort_by",
+            index=columns.index(sort_by) if sort_by in columns else 0,
+        )
+    with direction_col:
+        ascending = st.toggle("Ascending", value=ascending, key=f"{key}_ascending")
+    with filter_col:
+        filter_column = st.selectbox("Filter column", options=columns, key=f"{key}_filter_column")
+    with text_col:
+        filter_text = st.text_input("Contains", key=f"{key}_filter_text")
+
+    # Recompute the display order only when the data or sort/filter change.
+    # The frame itself is kept in the view so its id can't be reused.
+    signature = (id(df), sort_by, ascending, filter_column, filter_text)
+    if view.get("signature") != signature:
+        view["data"] = df
+        view["signature"] = signature
+        view["positions"] = _positions(df, sort_by, ascending, filter_column, filter_text)
+    positions = view["positions"]
+
+    page_size_key = f"{key}_page_size"
+    page_key = f"{key}_page"
+    if page_size_key not in st.session_state:
+        st.session_state[page_size_key] = PAGE_SIZES[0]
+    if page_key not in st.session_state:
+        st.session_state[page_key] = 1
+    page_size = st.session_state[page_size_key]
+    total_pages = max(-(-len(positions) // page_size), 1)
+    st.session_state[page_key] = min(st.session_state[page_key], total_pages)
+    current_page = st.session_state[page_key]
+
+    offset = (current_page - 1) * page_size
+    page_data = df.iloc[positions[offset:offset + page_size]]
+    page_data.index = range(offset + 1, offset + len(page_data) + 1)
+
+    st.dataframe(page_data, use_container_width=True)
+    st.markdown(f"Page **{current_page}** of **{total_pages}**")
+    pagination_col1, pagination_col2 = st.columns([3, 1])
+    with pagination_col1:
+        st.selectbox("Page Size", options=PAGE_SIZES, key=page_size_key)
+    with pagination_col2:
+        st.number_input("Page", min_value=1, max_value=total_pages, step=1, key=page_key)
@@ -0,0 +1,244 @@
+import hashlib
+import json
+import os
+import tempfile
+from dataclasses import dataclass
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# Uploaded CSV exports (offline sales, ad spend, ...) to blend with GA4 data.
+# An upload is parsed a block at a time into a Parquet file under UPLOAD_DIR,
+# so only one block is ever in memory as columns, and summary statistics are
+# accumulated along the way and kept in the file's footer. Files are named by
+# content hash: the same export uploaded again, from any session, reuses its
+# Parquet file. Charts query the file by column and date range, reading only
+# the columns and row groups they need.
+
+UPLOAD_DIR = os.environ.get(
+    "DASHBOARD_UPLOAD_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "uploads"),
+)
+# Bytes of CSV parsed per block (a row group of the Parquet file). Bigger
+# blocks aren't faster, they just hold more in memory.
+BLOCK_SIZE = 4 * 2**20
+SUMMARY_KEY = b"dashboard.summary"
+
+# Column types are picked from this many values at the start of the file:
+# numbers/dates if PARSE_THRESHOLD of them parse
+SAMPLE_VALUES = 1000
+PARSE_THRESHOLD = 0.95
+DATE_FORMATS = ("%Y-%m-%d", "%Y%m%d", "%d/%m/%Y", "%m/%d/%Y", "%Y/%m/%d", "%d-%m-%Y", "%d.%m.%Y")
+# Currency signs, thousands separators and spaces in exported figures
+NUMBER_NOISE = r"[£$€,\s]"
+NUMBER = r"^[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?$"
+# Distinct values counted per text column before giving up
+MAX_DISTINCT = 10_000
+
+ARROW_TYPES = {"number": pa.float64(), "date": pa.timestamp("ns"), "text": pa.string()}
+
+
+@dataclass(frozen=True)
+class Upload:
+    name: str
+    path: str
+    # {"rows": n, "columns": {name: {"type": "number"|"date"|"text", ...}}}
+    summary: dict
+
+    def columns(self, kind):
+        return [name for name, stats in self.summary["columns"].items() if stats["type"] == kind]
+
+
+# String columns to typed ones; values that don't parse become nulls
+
+def _to_number(strings):
+    cleaned = pc.replace_substring_regex(strings, NUMBER_NOISE, "")
+    return pc.cast(pc.if_else(pc.match_substring_regex(cleaned, NUMBER), cleaned, None), pa.float64())
+
+
+def _to_date(strings, fmt):
+    # Exports repeat the same few hundred dates, so parse each once
+    encoded = pc.dictionary_encode(strings).combine_chunks()
+    parsed = pc.strptime(encoded.dictionary, format=fmt, unit="ns", error_is_null=True)
+    return pc.take(parsed, encoded.indices)
+
+
+def _convert(strings, kind, fmt):
+    if kind == "number":
+        return _to_number(strings)
+    if kind == "date":
+        return _to_date(strings, fmt)
+    return strings
+
+
+def _column_type(strings):
+    # ("number", None), ("date", format) or ("text", None); blank columns
+    # are text so nothing later gets coerced away
+    values = strings.drop_null()[:SAMPLE_VALUES]
+    if len(values) == 0:
+        return "text", None
+    parses = lambda converted: converted.null_count <= (1 - PARSE_THRESHOLD) * len(values)
+    for fmt in DATE_FORMATS:
+        if parses(_to_date(values, fmt)):
+            return "date", fmt
+    if parses(_to_number(values)):
+        return "number", None
+    return "text", None
+
+
+class _Summary:
+
+    def __init__(self, types):
+        self.rows = 0
+        self.columns = {}
+        for name, (kind, _) in types.items():
+            stats = {"type": kind, "nulls": 0}
+            if kind == "number":
+                stats.update(invalid=0, count=0, sum=0.0, min=None, max=None)
+            elif kind == "date":
+                stats.update(invalid=0, min=None, max=None)
+            else:
+                stats["distinct"] = set()
+            self.columns[name] = stats
+
+    def add(self, raw, converted):
+        self.rows += raw.num_rows
+        for name, stats in self.columns.items():
+            strings, column = raw[name], converted[name]
+            stats["nulls"] += strings.null_count
+            if stats["type"] == "text":
+                if stats["distinct"] is not None:
+                    stats["distinct"].update(pc.unique(column).drop_null().to_pylist())
+                    if len(stats["distinct"]) > MAX_DISTINCT:
+                        stats["distinct"] = None
+                continue
+            # Values that were there but didn't parse
+            stats["invalid"] += column.null_count - strings.null_count
+            if column.null_count == len(column):
+                continue
+            bounds = pc.min_max(column).as_py()
+            stats["min"] = bounds["min"] if stats["min"] is None else min(stats["min"], bounds["min"])
+            stats["max"] = bounds["max"] if stats["max"] is None else max(stats["max"], bounds["max"])
+            if stats["type"] == "number":
+                stats["count"] += len(column) - column.null_count
+                stats["sum"] += pc.sum(column).as_py()
+
+    def as_dict(self):
+        columns = {}
+        for name, stats in self.columns.items():
+            stats = dict(stats)
+            if stats["type"] == "number":
+                stats["mean"] = stats["sum"] / stats["count"] if stats["count"] else None
+            elif stats["type"] == "date":
+                for key in ("min", "max"):
+                    if stats[key] is not None:
+                        stats[key] = pd.Timestamp(stats[key]).isoformat()
+            else:
+                distinct = stats.pop("distinct")
+                stats["distinct"] = len(distinct) if distinct is not None else None
+            columns[name] = stats
+        return {"rows": self.rows, "columns": columns}
+
+
+def _csv_blocks(file, block_size):
+    # Every column read as strings (empty/"NA"-style cells as nulls); the
+    # header goes through pandas so duplicate names come out unique
+    file.seek(0)
+    names = list(pd.read_csv(file, nrows=0, encoding="utf-8-sig").columns)
+    file.seek(0)
+    return pa_csv.open_csv(
+        file,
+        read_options=pa_csv.ReadOptions(column_names=names, skip_rows=1, block_size=block_size),
+        convert_options=pa_csv.ConvertOptions(
+            column_types={name: pa.string() for name in names},
+            strings_can_be_null=True,
+        ),
+    )
+
+
+def ingest(file, name=None, block_size=BLOCK_SIZE):
+    # file: a seekable binary file object holding a CSV, such as
+    # st.file_uploader's UploadedFile. Returns an Upload; raises ValueError
+    # for files that aren't readable CSV.
+    name = name or getattr(file, "name", "upload.csv")
+    file.seek(0)
+    digest = hashlib.file_digest(file, "sha256").hexdigest()
+    path = os.path.join(UPLOAD_DIR, f"{digest}.parquet")
+    if os.path.exists(path):
+        return load(path, name)
+
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    blocks = _csv_blocks(file, block_size)
+    # Written to a temp file next to its final name, then moved into place
+    fd, tmp_path = tempfile.mkstemp(dir=UPLOAD_DIR, suffix=".parquet.tmp")
+    os.close(fd)
+    writer = None
+    try:
+        for block in blocks:
+            raw = pa.Table.from_batches([block])
+            if writer is None:
+                types = {column: _column_type(raw[column]) for column in raw.column_names}
+                schema = pa.schema([(column, ARROW_TYPES[kind]) for column, (kind, _) in types.items()])
+                writer = pq.ParquetWriter(tmp_path, schema)
+                summary = _Summary(types)
+            converted = pa.table(
+                [_convert(raw[column], kind, fmt) for column, (kind, fmt) in types.items()],
+                schema=schema,
+            )
+            summary.add(raw, converted)
+            writer.write_table(converted)
+        if writer is None:
+            raise ValueError(f"{name} has no rows")
+        writer.add_key_value_metadata({SUMMARY_KEY: json.dumps(summary.as_dict())})
+        writer.close()
+        os.replace(tmp_path, path)
+    except BaseException:
+        if writer is not None:
+            writer.close()
+        os.remove(tmp_path)
+        raise
+    return load(path, name)
+
+
+def load(path, name=None):
+    metadata = pq.read_metadata(path).metadata
+    return Upload(name or os.path.basename(path), path, json.loads(metadata[SUMMARY_KEY]))
+
+
+def preview(upload, rows=100):
+    batches = pq.ParquetFile(upload.path).iter_batches(batch_size=rows)
+    return next(batches).to_pandas()
+
+
+def summary_frame(upload):
+    # One row per column, for st.dataframe
+    return pd.DataFrame([
+        {"Column": name, **{key.capitalize(): value for key, value in stats.items() if key != "sum"}}
+        for name, stats in upload.summary["columns"].items()
+    ])
+
+
+def daily(upload, date_column, metrics, start=None, end=None):
+    # Metrics summed per day over [start, end], shaped like the daily
+    # series from daily_store: a 'date' column plus one per metric.
+    # Scanned a batch at a time, reading only these columns and skipping
+    # row groups outside the range.
+    condition = ds.field(date_column).is_valid()
+    if start is not None:
+        condition &= ds.field(date_column) >= pd.Timestamp(start)
+    if end is not None:
+        condition &= ds.field(date_column) <= pd.Timestamp(end)
+    scanner = ds.dataset(upload.path).scanner(columns=[date_column, *metrics], filter=condition)
+    partials = [
+        batch.to_pandas().groupby(date_column).sum()
+        for batch in scanner.to_batches()
+        if batch.num_rows
+    ]
+    if not partials:
+        return pd.DataFrame({"date": pd.Series(dtype="datetime64[ns]"), **{m: pd.Series(dtype=float) for m in metrics}})
+    totals = pd.concat(partials).groupby(level=0).sum().sort_index()
+    return totals.rename_axis("date").reset_index()
@@ -0,0 +1,154 @@
+import argparse
+import datetime
+import logging
+import os
+import threading
+import time
+from concurrent.futures import wait
+
+import streamlit as st
+
+# Cache warmer. Prefetches the reports the Sales and SEO pages ask for over
+# the date ranges people usually pick, so the first page load of the morning
+# is served from warm data. Fetches go through the same page_reports
+# definitions and cache/store paths as the pages themselves.
+#
+# In the app process (DASHBOARD_WARM_INTERVAL set, started from app.py) it
+# fills the shared report cache and the daily store. Run from the command
+# line it's a separate process, so only the on-disk daily store carries over
+# to the app: it warms just the daily series, rather than spending quota on
+# reports it would throw away on exit.
+#
+#     python warm.py               # one pass
+#     python warm.py --every 3600  # keep warming hourly
+#
+# app.py imports this on the login page, so the reporting modules are only
+# imported once a pass actually runs.
+
+log = logging.getLogger("warm")
+
+# Seconds between passes of the in-process warmer; 0 leaves it off
+WARM_INTERVAL = float(os.environ.get("DASHBOARD_WARM_INTERVAL", 0))
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def common_ranges(today=None):
+    # [(label, current (start, end), compared (start, end))]
+    import page_reports
+
+    today = today or datetime.date.today()
+    day = datetime.timedelta(days=1)
+    iso = lambda d: d.strftime("%Y-%m-%d")
+
+    ranges = []
+    for days in (7, 30, 90):
+        start = today - (days - 1) * day
+        previous_end = start - day
+        previous_start = previous_end - (days - 1) * day
+        ranges.append((f"last {days} days", (iso(start), iso(today)), (iso(previous_start), iso(previous_end))))
+
+    month_start = today.replace(day=1)
+    previous_month_end = month_start - day
+    ranges.append((
+        "month to date",
+        (iso(month_start), iso(today)),
+        (iso(previous_month_end.replace(day=1)), iso(previous_month_end)),
+    ))
+
+    # What the sidebar date_inputs start out as
+    defaults = (page_reports.DEFAULT_START, iso(today))
+    ranges.append(("sidebar defaults", defaults, defaults))
+    return ranges
+
+
+def _warm(name, fetch):
+    import reports
+
+    served = reports.track_freshness()
+    started = time.perf_counter()
+    try:
+        result = fetch()
+        # Stale cache entries come back at once and refresh in the
+        # background; the pass isn't done until those have landed too
+        wait(served.pending)
+    except Exception:
+        log.exception("%s: failed", name)
+        return
+    elapsed = time.perf_counter() - started
+    if isinstance(result, dict):
+        # The planner's GA4 group: rows per logical report
+        counts = ", ".join(
+            f"{part} deferred" if df is None else f"{part} {len(df)} rows"
+            for part, df in result.items()
+        )
+    else:
+        counts = f"{len(result)} rows"
+    log.info("%s: %.2fs (%s)", name, elapsed, counts)
+
+
+def warm_once(ga4_client, gsc_service, today=None, stored_only=False):
+    # One sequential pass, so the logged time is each report's own cost.
+    # stored_only: just the fetches kept in the daily store
+    import page_reports
+    import reports
+
+    started = time.perf_counter()
+    for label, current, compared in common_ranges(today):
+        pages = {
+            "sales": page_reports.sales_fetches(ga4_client, current, compared),
+            "seo": page_reports.seo_fetches(ga4_client, gsc_service, current, compared),
+        }
+        for page, fetches in pages.items():
+            for name, fetch in fetches.items():
+                if stored_only and name not in page_reports.STORED_FETCHES:
+                    continue
+                _warm(f"{page} {label} {name}", fetch)
+    log.info("warm pass done in %.1fs, cache %s", time.perf_counter() - started, reports.report_cache.stats())
+
+
+def _clients():
+    import clients
+
+    return (
+        clients.ga4_client(st.secrets["ga4_service_account"]),
+        clients.gsc_service(st.secrets["gsc_service_account"]),
+    )
+
+
+def _warm_every(interval, stored_only=False):
+    while True:
+        started = time.monotonic()
+        try:
+            warm_once(*_clients(), stored_only=stored_only)
+        except Exception:
+            log.exception("warm pass failed")
+        time.sleep(max(interval - (time.monotonic() - started), 0))
+
+
+def start_scheduler(interval=WARM_INTERVAL):
+    # Safe to call on every script run: starts one warmer thread per process
+    global _scheduler
+    if not interval:
+        return None
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = threading.Thread(target=_warm_every, args=(interval,), name="cache-warmer", daemon=True)
+            _scheduler.start()
+    return _scheduler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prefetch dashboard reports for common date ranges.")
+    parser.add_argument("--every", type=float, default=0, help="keep running, one pass every N seconds")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+    if args.every:
+        _warm_every(args.every, stored_only=True)
+    else:
+        warm_once(*_clients(), stored_only=True)
+
+
+if __name__ == "__main__":
+    main()